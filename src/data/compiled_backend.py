@@ -0,0 +1,211 @@
+'''Compiled ODE backend for PySB models. The right-hand side and analytic Jacobian of the expanded mass-action network
+are written out as C, compiled once per model structure and cached on disk next to the pickled network. Rate constants
+and initial conditions are arguments of the compiled functions, so changing Ls_0, k_lck_on_RL, ... reuses the same
+module.'''
+
+import ctypes
+import hashlib
+import os
+import pickle
+import subprocess
+import tempfile
+
+import numpy as np
+from pysb.integrate import odesolve
+from scipy.integrate import odeint
+
+from src.data.mass_action_network import from_pysb_model
+
+BACKENDS = ["python", "compiled"]
+
+cache_directory = os.environ.get("CHANNEL_CAPACITY_CACHE", os.path.expanduser("~/.cache/channel_capacity"))
+
+# Compiled networks already loaded by this process, keyed by structure_key
+loaded_networks = {}
+
+# Expanded networks used by the python backend of solve_observables, keyed by structure_key
+expanded_networks = {}
+
+
+def structure_key(model):
+    '''Hash of everything that determines the expanded network, but not of parameter or initial values.'''
+    text = [repr(rule) for rule in model.rules]
+    text += [parameter.name for parameter in model.parameters]
+    text += [str(pattern) for pattern, parameter in model.initial_conditions]
+    text += [repr(observable) for observable in model.observables]
+
+    return hashlib.sha1("\n".join(text).encode("utf-8")).hexdigest()
+
+
+def rate_term(network, j, skip=None):
+    factors = ["k[{0}]".format(j)]
+    for p, species in enumerate(network.reactants[j]):
+        if p != skip and species < network.num_species:
+            factors.append("y[{0}]".format(species))
+
+    return "*".join(factors)
+
+
+def generate_source(network):
+    n = network.num_species
+    lines = ["#include <string.h>", ""]
+
+    lines.append("void rhs(const double *y, const double *k, double *dydt) {")
+    lines.append("    double r[{0}];".format(max(network.num_reactions, 1)))
+    for j in range(network.num_reactions):
+        lines.append("    r[{0}] = {1};".format(j, rate_term(network, j)))
+    for i in range(n):
+        terms = ["{0:+.1f}*r[{1}]".format(network.stoichiometry[i, j], j)
+                 for j in np.nonzero(network.stoichiometry[i])[0]]
+        lines.append("    dydt[{0}] = 0.0{1};".format(i, "".join(" " + t for t in terms)))
+    lines.append("}")
+    lines.append("")
+
+    jacobian = {}
+    for j in range(network.num_reactions):
+        for p, species in enumerate(network.reactants[j]):
+            if species == n:
+                continue
+            partial = rate_term(network, j, skip=p)
+            for i in np.nonzero(network.stoichiometry[:, j])[0]:
+                jacobian.setdefault((i, species), []).append(
+                    "{0:+.1f}*{1}".format(network.stoichiometry[i, j], partial))
+
+    lines.append("void jac(const double *y, const double *k, double *J) {")
+    lines.append("    memset(J, 0, sizeof(double) * {0});".format(n * n))
+    for (i, species), terms in sorted(jacobian.items()):
+        lines.append("    J[{0}] = 0.0{1};".format(i * n + species, "".join(" " + t for t in terms)))
+    lines.append("}")
+    lines.append("")
+
+    return "\n".join(lines)
+
+
+def compile_network(network, library_path):
+    '''Compiles the network to library_path. The library is written under a temporary name and renamed into place, so
+    concurrent workers compiling the same structure never load a partial file.'''
+    directory = os.path.dirname(library_path)
+    source_file = tempfile.NamedTemporaryFile(mode="w", suffix=".c", dir=directory, delete=False)
+    source_file.write(generate_source(network))
+    source_file.close()
+
+    temporary_library = source_file.name[:-2] + ".so"
+    compiler = os.environ.get("CC", "cc")
+    try:
+        subprocess.check_call([compiler, "-O2", "-shared", "-fPIC", "-o", temporary_library, source_file.name])
+        os.rename(temporary_library, library_path)
+    finally:
+        os.remove(source_file.name)
+        if os.path.exists(temporary_library):
+            os.remove(temporary_library)
+
+
+def update_parameters(network, model):
+    '''Copies the current parameter values of the PySB model (e.g. a new Ls_0) into the network.'''
+    network.parameter_values = np.array([model.parameters[name].value for name in network.parameter_names],
+                                        dtype=float)
+
+
+class CompiledNetwork(object):
+    def __init__(self, network, library_path):
+        self.network = network
+        self.library = ctypes.CDLL(library_path)
+
+        array = np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS')
+        for function in [self.library.rhs, self.library.jac]:
+            function.argtypes = [array, array, array]
+            function.restype = None
+
+    def rhs(self, y, t, k):
+        dydt = np.empty(self.network.num_species)
+        self.library.rhs(np.ascontiguousarray(y), k, dydt)
+        return dydt
+
+    def jacobian(self, y, t, k):
+        jacobian = np.empty((self.network.num_species, self.network.num_species))
+        self.library.jac(np.ascontiguousarray(y), k, jacobian)
+        return jacobian
+
+    def update_parameters(self, model):
+        update_parameters(self.network, model)
+
+    def integrate(self, y0, tspan, k=None, rtol=1e-6, atol=1e-6, observables=None):
+        '''Species trajectory of shape (len(tspan), n_species), or of the given observables only.'''
+        if k is None:
+            k = self.network.rate_constants()
+
+        y = odeint(self.rhs, y0, tspan, args=(np.ascontiguousarray(k, dtype=float),), Dfun=self.jacobian,
+                   rtol=rtol, atol=atol, mxstep=20000)
+        if observables is not None:
+            return y.dot(self.network.observable_rows(observables).T)
+
+        return y
+
+    def solve(self, model, tspan):
+        '''Same record layout as odesolve: one field per species (__s0, ...) and one per observable.'''
+        self.update_parameters(model)
+        y = self.integrate(self.network.initial_state(), tspan)
+
+        names = ["__s{0}".format(i) for i in range(self.network.num_species)] + self.network.observable_names
+        columns = list(y.T) + list(self.network.observables(y).T)
+
+        return np.rec.fromarrays(columns, names=names)
+
+
+def load_compiled_network(model):
+    '''Loads the compiled network for the structure of model, generating and compiling it on a cache miss.'''
+    key = structure_key(model)
+    if key in loaded_networks:
+        return loaded_networks[key]
+
+    if not os.path.exists(cache_directory):
+        os.makedirs(cache_directory)
+
+    library_path = os.path.join(cache_directory, key + ".so")
+    network_path = os.path.join(cache_directory, key + ".pickle")
+
+    if os.path.exists(library_path) and os.path.exists(network_path):
+        network = pickle.load(open(network_path, "rb"))
+    else:
+        network = from_pysb_model(model)
+        compile_network(network, library_path)
+
+        pickle_out = tempfile.NamedTemporaryFile(suffix=".pickle", dir=cache_directory, delete=False)
+        pickle.dump(network, pickle_out)
+        pickle_out.close()
+        os.rename(pickle_out.name, network_path)
+
+    loaded_networks[key] = CompiledNetwork(network, library_path)
+    return loaded_networks[key]
+
+
+def load_network(model):
+    key = structure_key(model)
+    if key not in expanded_networks:
+        expanded_networks[key] = from_pysb_model(model)
+
+    return expanded_networks[key]
+
+
+def solve_observables(model, times, observables, backend="python"):
+    '''Values of the named observables at times alone, shape (len(times), len(observables)); times[0] is the initial
+    time. Unlike solve_ode no species trajectories or record array are built.'''
+    if backend == "python":
+        network = load_network(model)
+        update_parameters(network, model)
+        return network.integrate(network.initial_state()[None], times, observables=observables)[0]
+    elif backend == "compiled":
+        compiled = load_compiled_network(model)
+        compiled.update_parameters(model)
+        return compiled.integrate(compiled.network.initial_state(), times, observables=observables)
+    else:
+        raise ValueError("Unknown ODE backend {0}, choose from {1}".format(backend, BACKENDS))
+
+
+def solve_ode(model, tspan, backend="python"):
+    if backend == "python":
+        return odesolve(model, tspan, compiler="python")
+    elif backend == "compiled":
+        return load_compiled_network(model).solve(model, tspan)
+    else:
+        raise ValueError("Unknown ODE backend {0}, choose from {1}".format(backend, BACKENDS))
@@ -0,0 +1,104 @@
+'''Hybrid deterministic/stochastic simulation of an expanded PySB network. Species with at least threshold copies are
+continuous; a reaction is deterministic when every species it changes is continuous and is integrated with the
+mass-action right-hand side, while the remaining reactions fire as discrete SSA events. The partition is recomputed on a
+fixed grid of time_step, and each grid step is split (Strang splitting) into half a step of the ODE, a full step of SSA
+firings of the stochastic reactions with the continuous species changing only by those firings, and another half step
+of the ODE. The ODE is therefore solved twice per grid step however often the low-copy reactions fire, and the
+splitting error is O(time_step^2).'''
+
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from src.data.stochastic_simulation import from_mass_action
+
+
+class HybridSimulator(object):
+    def __init__(self, network, threshold=100, time_step=0.1, rtol=1e-6, atol=1e-3):
+        self.network = network
+        self.stochastic_network = from_mass_action(network)
+        self.threshold = threshold
+        self.time_step = time_step
+        self.rtol = rtol
+        self.atol = atol
+
+        self.changes = network.stoichiometry != 0
+
+        # ODE solves and stochastic firings of all simulate calls so far
+        self.num_integrations = 0
+        self.num_events = 0
+
+    def partition(self, y):
+        '''Boolean masks of the continuous species and of the deterministic reactions.'''
+        continuous = y >= self.threshold
+        deterministic = np.all(continuous[:, None] | ~self.changes, axis=0)
+        return continuous, deterministic
+
+    def integrate(self, y, t, dt, deterministic, k):
+        '''Evolves y over dt by the deterministic reactions alone.'''
+        if not deterministic.any():
+            return y
+
+        network = self.network
+        stoichiometry = network.stoichiometry[:, deterministic]
+
+        def f(time, z):
+            return stoichiometry.dot(network.rates(z[None], k=k)[0][deterministic])
+
+        def jac(time, z):
+            return stoichiometry.dot(network.rate_derivatives(z[None], k=k)[0][deterministic])
+
+        solution = solve_ivp(f, (t, t + dt), y, method='BDF', jac=jac, rtol=self.rtol, atol=self.atol)
+        self.num_integrations += 1
+        return np.maximum(solution.y[:, -1], 0.0)
+
+    def fire(self, y, t, dt, stochastic):
+        '''Exact SSA over dt of the reactions in the stochastic mask alone.'''
+        network = self.stochastic_network
+        state = np.append(y, 1.0)
+        a = np.zeros(network.num_reactions)
+        a[stochastic] = network.propensities(state, np.nonzero(stochastic)[0])
+        t_end = t + dt
+
+        while True:
+            a0 = a.sum()
+            if a0 <= 0:
+                break
+            t += -np.log(1.0 - np.random.random()) / a0
+            if t >= t_end:
+                break
+
+            j = min(np.searchsorted(np.cumsum(a), np.random.random() * a0, side='right'), network.num_reactions - 1)
+            state[network.changed_species[j]] += network.changes[j]
+            dependencies = network.dependencies[j]
+            a[dependencies] = network.propensities(state, dependencies) * stochastic[dependencies]
+            self.num_events += 1
+
+        return state[:-1]
+
+    def advance(self, y, t, dt, k):
+        '''One step of the partition grid from t to t + dt. Species that have become discrete are rounded.'''
+        continuous, deterministic = self.partition(y)
+        y[~continuous] = np.round(y[~continuous])
+
+        y = self.integrate(y, t, dt / 2.0, deterministic, k)
+        y = self.fire(y, t, dt, ~deterministic)
+        return self.integrate(y, t + dt / 2.0, dt / 2.0, deterministic, k)
+
+    def simulate(self, y0, times, k=None):
+        '''One hybrid trajectory from y0 at time 0. Returns the state at each of the increasing times, shape
+        (len(times), n_species).'''
+        if k is None:
+            k = self.network.rate_constants()
+
+        y = np.array(y0, dtype=float)
+        output = np.zeros((len(times), self.network.num_species))
+
+        t = 0.0
+        for i, t_record in enumerate(times):
+            while t < t_record:
+                t_next = min(t + self.time_step, t_record)
+                y = self.advance(y, t, t_next - t, k)
+                t = t_next
+            output[i] = y
+
+        return output
@@ -0,0 +1,34 @@
+'''Linear noise approximation of a MassActionNetwork about its steady state. The stationary covariance C of the copy
+numbers solves the Lyapunov equation J C + C J^T + S diag(rates) S^T = 0. Since the conservation laws make J singular,
+the equation is solved in the reduced basis of the stoichiometric subspace, in which the steady state is stable.'''
+
+import numpy as np
+import scipy.linalg
+
+from src.data.steady_state import reduced_basis
+
+
+class LinearNoiseApproximation(object):
+    def __init__(self, network):
+        self.network = network
+        self.basis = reduced_basis(network.stoichiometry)
+
+    def covariance(self, y, k=None):
+        '''Stationary covariance of the species at the steady state y, shape (n_species, n_species).'''
+        if k is None:
+            k = self.network.rate_constants()
+
+        jacobian = self.network.jacobian(y[None], k=k)[0]
+        rates = self.network.rates(y[None], k=k)[0]
+        diffusion = (self.network.stoichiometry * rates).dot(self.network.stoichiometry.T)
+
+        reduced_jacobian = self.basis.T.dot(jacobian).dot(self.basis)
+        reduced_diffusion = self.basis.T.dot(diffusion).dot(self.basis)
+        reduced_covariance = scipy.linalg.solve_continuous_lyapunov(reduced_jacobian, -reduced_diffusion)
+
+        return self.basis.dot(reduced_covariance).dot(self.basis.T)
+
+    def output_variance(self, steady_states, observables, k=None):
+        '''Variance of the sum of the given observables for every steady state (one per row).'''
+        weights = self.network.observable_rows(observables).sum(axis=0)
+        return np.array([weights.dot(self.covariance(y, k=k)).dot(weights) for y in steady_states])
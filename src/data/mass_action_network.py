@@ -0,0 +1,175 @@
+'''Mass-action form of an expanded PySB reaction network. Rates, right-hand side and Jacobian are evaluated with NumPy
+for a whole batch of states (n_samples x n_species) at once, so a ligand sweep can be integrated as one ODE system.'''
+
+import numpy as np
+import scipy.sparse
+import sympy
+from pysb.bng import generate_equations
+from scipy.integrate import solve_ivp
+
+
+class MassActionNetwork(object):
+    def __init__(self, species, parameter_names, parameter_values, reactants, stoichiometry, rate_factors,
+                 rate_parameters, initial_parameters, observable_names, observable_matrix):
+        self.species = species
+        self.parameter_names = parameter_names
+        self.parameter_values = np.array(parameter_values, dtype=float)
+
+        # reactants is (n_reactions x max_order), padded with n_species which indexes a column of ones
+        self.reactants = reactants
+        self.stoichiometry = stoichiometry
+        self.rate_factors = rate_factors
+        self.rate_parameters = rate_parameters
+        self.initial_parameters = initial_parameters
+
+        self.observable_names = observable_names
+        self.observable_matrix = observable_matrix
+
+        self.num_species = len(self.species)
+        self.num_reactions = self.stoichiometry.shape[1]
+
+    def parameter_index(self, name):
+        return self.parameter_names.index(name)
+
+    def set_parameter(self, name, value):
+        self.parameter_values[self.parameter_index(name)] = value
+
+    def rate_constants(self):
+        return self.rate_factors * self.parameter_values[self.rate_parameters]
+
+    def initial_state(self):
+        y0 = np.zeros(self.num_species)
+        mask = self.initial_parameters >= 0
+        y0[mask] = self.parameter_values[self.initial_parameters[mask]]
+        return y0
+
+    def initial_states(self, parameter, values):
+        '''Stack of initial states, one row per value of the initial-condition parameter (e.g. Ls_0).'''
+        y0 = np.tile(self.initial_state(), (len(values), 1))
+        columns = np.where(self.initial_parameters == self.parameter_index(parameter))[0]
+        y0[:, columns] = np.asarray(values, dtype=float)[:, None]
+        return y0
+
+    def extend(self, y):
+        return np.concatenate([y, np.ones((y.shape[0], 1))], axis=1)
+
+    def rates(self, y, k=None):
+        if k is None:
+            k = self.rate_constants()
+        y_ext = self.extend(y)
+        rates = np.tile(k, (y.shape[0], 1))
+        for p in range(self.reactants.shape[1]):
+            rates *= y_ext[:, self.reactants[:, p]]
+        return rates
+
+    def rhs(self, y, k=None):
+        return self.rates(y, k=k).dot(self.stoichiometry.T)
+
+    def rate_derivatives(self, y, k=None):
+        '''d(rate_j)/d(y_i) for every state in the batch, shape (n_samples, n_reactions, n_species).'''
+        if k is None:
+            k = self.rate_constants()
+        y_ext = self.extend(y)
+        reactions = np.arange(self.num_reactions)
+        order = self.reactants.shape[1]
+
+        d_rates = np.zeros((y.shape[0], self.num_reactions, self.num_species + 1))
+        for p in range(order):
+            partial = np.tile(k, (y.shape[0], 1))
+            for q in range(order):
+                if q != p:
+                    partial *= y_ext[:, self.reactants[:, q]]
+            d_rates[:, reactions, self.reactants[:, p]] += partial
+
+        return d_rates[:, :, :self.num_species]
+
+    def jacobian(self, y, k=None):
+        return np.einsum('sr,nri->nsi', self.stoichiometry, self.rate_derivatives(y, k=k))
+
+    def observables(self, y):
+        '''Observable values for states y of shape (..., n_species); returns shape (..., n_observables).'''
+        return y.dot(self.observable_matrix.T)
+
+    def observable(self, y, name):
+        return self.observables(y)[..., self.observable_names.index(name)]
+
+    def observable_rows(self, names):
+        return self.observable_matrix[[self.observable_names.index(name) for name in names]]
+
+    def integrate(self, y0, tspan, k=None, rtol=1e-7, atol=1e-6, observables=None):
+        '''Integrates all rows of y0 as one stacked stiff system. Returns species trajectories of shape
+        (n_samples, len(tspan), n_species), or with observables given only those observables, of shape
+        (n_samples, len(tspan), len(observables)). States are stored at the points of tspan alone, so passing just the
+        initial and final time records nothing else. The error norm is taken over the whole batch, hence the tight
+        rtol.'''
+        if k is None:
+            k = self.rate_constants()
+        num_samples = y0.shape[0]
+        size = num_samples * self.num_species
+        blocks = (np.arange(num_samples), np.arange(num_samples + 1))
+
+        def f(t, y):
+            return self.rhs(y.reshape(num_samples, self.num_species), k=k).ravel()
+
+        def jac(t, y):
+            j = self.jacobian(y.reshape(num_samples, self.num_species), k=k)
+            return scipy.sparse.bsr_matrix((j, blocks[0], blocks[1]), shape=(size, size))
+
+        solution = solve_ivp(f, (tspan[0], tspan[-1]), y0.ravel(), method='BDF', t_eval=tspan, jac=jac,
+                             rtol=rtol, atol=atol)
+        if not solution.success:
+            raise RuntimeError("Batched integration failed: " + solution.message)
+
+        y = solution.y.reshape(num_samples, self.num_species, len(tspan)).transpose(0, 2, 1)
+        if observables is not None:
+            return y.dot(self.observable_rows(observables).T)
+
+        return y
+
+
+def rate_constant(reaction, parameter_names):
+    species = sympy.Mul(*[sympy.Symbol('__s{0}'.format(r)) for r in reaction['reactants']])
+    factor, parameter = (reaction['rate'] / species).as_coeff_Mul()
+
+    if getattr(parameter, 'name', None) not in parameter_names:
+        raise ValueError("Reaction rate {0} is not mass action in a single parameter".format(reaction['rate']))
+
+    return float(factor), parameter_names.index(parameter.name)
+
+
+def from_pysb_model(model):
+    generate_equations(model)
+
+    species = [str(s) for s in model.species]
+    parameter_names = [p.name for p in model.parameters]
+    parameter_values = [p.value for p in model.parameters]
+
+    num_species = len(species)
+    num_reactions = len(model.reactions)
+    order = max(len(r['reactants']) for r in model.reactions)
+
+    reactants = np.full((num_reactions, order), num_species, dtype=int)
+    stoichiometry = np.zeros((num_species, num_reactions))
+    rate_factors = np.zeros(num_reactions)
+    rate_parameters = np.zeros(num_reactions, dtype=int)
+
+    for j, reaction in enumerate(model.reactions):
+        reactants[j, :len(reaction['reactants'])] = reaction['reactants']
+        for r in reaction['reactants']:
+            stoichiometry[r, j] -= 1
+        for p in reaction['products']:
+            stoichiometry[p, j] += 1
+
+        rate_factors[j], rate_parameters[j] = rate_constant(reaction, parameter_names)
+
+    initial_parameters = np.full(num_species, -1, dtype=int)
+    for pattern, parameter in model.initial_conditions:
+        initial_parameters[model.get_species_index(pattern)] = parameter_names.index(parameter.name)
+
+    observable_names = [o.name for o in model.observables]
+    observable_matrix = np.zeros((len(observable_names), num_species))
+    for i, o in enumerate(model.observables):
+        observable_matrix[i, o.species] = o.coefficients
+
+    return MassActionNetwork(species, parameter_names, parameter_values, reactants, stoichiometry, rate_factors,
+                             rate_parameters, initial_parameters, observable_names, observable_matrix)
@@ -0,0 +1,52 @@
+'''Persistent cache of built PySB T cell networks. An entry holds the expanded mass-action network (species, reactions,
+rate constants), the output observables and the text of the rules/parameters/observables files, so a job with a cached
+(class, steps, self_foreign, lf, parameter overrides, default rate constants and initial counts) combination needs
+neither the eval-driven make_model nor BioNetGen.'''
+
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+
+from src.data.compiled_backend import cache_directory
+
+
+def source_hash(model_class):
+    '''Hash of the module defining model_class, so that editing the rules invalidates its cached networks.'''
+    return hashlib.sha1(open(inspect.getsourcefile(model_class), "rb").read()).hexdigest()
+
+
+def settings(parameters):
+    '''Sorted attributes of a BindingParameters/InitialConcentrations object, nested objects included, so that editing
+    a default rate constant or initial count invalidates the cached networks built with it.'''
+    return sorted((name, settings(value) if hasattr(value, "__dict__") else value)
+                  for name, value in vars(parameters).items())
+
+
+class ModelCache(object):
+    def __init__(self, directory=None):
+        self.directory = os.path.join(directory or cache_directory, "models")
+
+    def key(self, tcr):
+        overrides = sorted(tcr.parameters.items()) if tcr.p_flag else []
+        description = repr((source_hash(tcr.__class__), tcr.__class__.__name__, tcr.steps, tcr.self_foreign, tcr.lf,
+                            overrides, settings(tcr.rate_constants), settings(tcr.initial_conditions)))
+        return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def load(self, key):
+        if not os.path.exists(self.path(key)):
+            return None
+        return pickle.load(open(self.path(key), "rb"))
+
+    def store(self, key, entry):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        pickle_out = tempfile.NamedTemporaryFile(suffix=".pickle", dir=self.directory, delete=False)
+        pickle.dump(entry, pickle_out)
+        pickle_out.close()
+        os.rename(pickle_out.name, self.path(key))
@@ -7,6 +7,7 @@ import subprocess
 import numpy as np
 import pandas as pd
 
+from src.data.parameter_sweep import ParameterSweep
 from src.general.directory_handling import make_and_cd
 from simulation_parameters import BindingParameters
 
@@ -26,6 +27,9 @@ class ParameterTesting(object):
         self.simulation_name = "ODE_steps_" + str(self.steps)
         self.simulation_time = 10
 
+        self.in_process = False
+        self.parameter_sets = []
+
     def generate_qsub(self, self_foreign=False):
 
         q = open("qsub.sh", "w")
@@ -74,6 +78,10 @@ class ParameterTesting(object):
         print("param_grid " + str(param_grid))
         self.parameters.append(str(param_grid))
 
+        if self.in_process:
+            self.parameter_sets.append(dict(param_grid))
+            return
+
         make_and_cd(file_path)
         self.make_launch_simulations(param_grid)
         os.chdir(self.home_directory)
@@ -180,6 +188,21 @@ class ParameterTesting(object):
         pickle.dump(param_grid, pickle_out)
         pickle_out.close()
 
+    def sweep_parameter_sets(self):
+        sweep = ParameterSweep(steps=self.steps, lf=self.lf)
+        self_outputs, foreign_outputs, capacities = sweep.run_dicts(self.parameter_sets)
+
+        for path, self_output, foreign_output in zip(self.paths, self_outputs, foreign_outputs):
+            for directory, output, ligand in zip(self.sub_directories, [self_output, foreign_output],
+                                                 [sweep.self_ligand, sweep.foreign_ligand]):
+                make_and_cd(os.path.join(path, directory))
+                np.savetxt("Ligand_concentrations", ligand, fmt='%f')
+                np.savetxt("output", output, fmt='%f')
+                os.chdir(self.home_directory)
+
+        df = pd.DataFrame({'file_path': self.paths, 'parameters': self.parameters, 'capacity': capacities})
+        df.to_csv("./capacities", sep='\t')
+
     # def run_tests(self):
     #     paths = []
     #     parameters = []
@@ -215,9 +238,15 @@ if __name__ == "__main__":
     parser.add_argument('--steps', dest='steps', action='store', type=int, default=8, help="number of KP steps.")
     parser.add_argument('--run', action='store_true', default=False, help='Flag for submitting simulations.')
     parser.add_argument('--lf', dest='lf', action='store', type=int, default=10, help="number of foreign ligands.")
+    parser.add_argument('--in-process', dest='in_process', action='store_true', default=False,
+                        help='Solve every parameter set in this process on one built model instead of submitting jobs.')
 
     args = parser.parse_args()
 
     p_test = ParameterTesting(steps=args.steps, lf=args.lf)
+    p_test.in_process = args.in_process
 
     p_test.run_real_neg_fb_parameter_search()
+
+    if p_test.in_process:
+        p_test.sweep_parameter_sets()
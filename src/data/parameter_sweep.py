@@ -0,0 +1,96 @@
+'''Rate-parameter sweeps over an already built T cell network. The self (Ls) and self + foreign (Ls_Lf) models are
+built and expanded once; every parameter set then only changes the parameter vector of the MassActionNetwork, so a
+whole grid of rate sets x ligand samples is solved in one process without rebuilding the model.'''
+
+import numpy as np
+
+from src.data.mass_action_network import from_pysb_model
+from src.data.pysb_t_cell_network import PysbTcrSelfWithForeign, parameter_aliases
+from src.data.steady_state import SteadyStateSolver
+from src.visualization.compute_ic import ArrayInformationCapacity
+
+
+class ParameterSweep(object):
+    def __init__(self, model_class=PysbTcrSelfWithForeign, steps=8, lf=30, steady_state=False):
+        self.steady_state = steady_state
+
+        # Built one after the other: a new pysb Model clears the components exported by the previous one
+        self_model = model_class(steps=steps)
+        self.self_observables = self_model.make_model()
+        self.self_network = from_pysb_model(self_model.model)
+
+        foreign_model = model_class(steps=steps, self_foreign=True, lf=lf)
+        self.foreign_observables = foreign_model.make_model()
+        self.foreign_network = from_pysb_model(foreign_model.model)
+
+        self.tspan = self_model.tspan
+        self.run_time = self_model.run_time
+        self.self_ligand = np.array(self_model.p_ligand, dtype=float)
+        self.foreign_ligand = np.array(foreign_model.p_ligand, dtype=float)
+
+        self.self_values = self.self_network.parameter_values.copy()
+        self.foreign_values = self.foreign_network.parameter_values.copy()
+
+    def set_parameters(self, network, default_values, parameter_names, values):
+        '''Resets network to its built parameters and applies one parameter set. Names the network does not contain
+        are ignored, as they are by make_model when read from parameters.pickle.'''
+        network.parameter_values = default_values.copy()
+        for name, value in zip(parameter_names, values):
+            name = parameter_aliases.get(name, name)
+            if name in network.parameter_names:
+                network.set_parameter(name, value)
+
+    def solve(self, network, observables, ligand):
+        '''Output (sum of the first two observables) at the end of the run for every ligand sample.'''
+        k = network.rate_constants()
+        if self.steady_state:
+            y = SteadyStateSolver(network).solve_sweep('Ls_0', ligand, self.run_time, k=k)
+        else:
+            y = network.integrate(network.initial_states('Ls_0', ligand), self.tspan, k=k)[:, -1]
+
+        return sum(network.observable(y, name) for name in observables[:2])
+
+    def run(self, parameter_names, parameter_sets, self_ligand=None, foreign_ligand=None):
+        '''parameter_sets has one row per parameter set and one column per name in parameter_names. Returns the self
+        outputs (n_sets x n_self_samples), foreign outputs (n_sets x n_foreign_samples) and the capacity of every
+        set.'''
+        parameter_sets = np.atleast_2d(np.asarray(parameter_sets, dtype=float))
+        if self_ligand is None:
+            self_ligand = self.self_ligand
+        if foreign_ligand is None:
+            foreign_ligand = self.foreign_ligand
+
+        self_outputs = np.zeros((len(parameter_sets), len(self_ligand)))
+        foreign_outputs = np.zeros((len(parameter_sets), len(foreign_ligand)))
+        capacities = np.zeros(len(parameter_sets))
+
+        for i, values in enumerate(parameter_sets):
+            self.set_parameters(self.self_network, self.self_values, parameter_names, values)
+            self.set_parameters(self.foreign_network, self.foreign_values, parameter_names, values)
+
+            self_outputs[i] = self.solve(self.self_network, self.self_observables, self_ligand)
+            foreign_outputs[i] = self.solve(self.foreign_network, self.foreign_observables, foreign_ligand)
+
+            capacities[i] = ArrayInformationCapacity(foreign_outputs[i], self_outputs[i], foreign_ligand=foreign_ligand,
+                                                     self_ligand=self_ligand).capacity
+
+        self.set_parameters(self.self_network, self.self_values, [], [])
+        self.set_parameters(self.foreign_network, self.foreign_values, [], [])
+
+        return self_outputs, foreign_outputs, capacities
+
+    def run_dicts(self, parameter_dicts, **kwargs):
+        '''Same as run for a list of {name: value} dictionaries as written to parameters.pickle.'''
+        parameter_names = sorted(set(name for parameters in parameter_dicts for name in parameters))
+        parameter_sets = []
+        for parameters in parameter_dicts:
+            defaults = [self.default_value(name) for name in parameter_names]
+            parameter_sets.append([parameters.get(name, default) for name, default in zip(parameter_names, defaults)])
+
+        return self.run(parameter_names, parameter_sets, **kwargs)
+
+    def default_value(self, name):
+        name = parameter_aliases.get(name, name)
+        if name in self.foreign_network.parameter_names:
+            return self.foreign_values[self.foreign_network.parameter_index(name)]
+        return np.nan
@@ -6,13 +6,14 @@ import subprocess
 import numpy as np
 import pandas as pd
 from pysb import *
-from pysb.integrate import odesolve
 
-from pysb_t_cell_network import write_columns, write_model_attributes
+from src.data.pysb_t_cell_network import write_columns, write_model_attributes
+from src.data.compiled_backend import BACKENDS, solve_ode
 from src.general.directory_handling import make_and_cd
+from src.general.parallel_sweep import parallel_sweep
 
 
-def add_new_monomer(product):
+def add_new_monomer(model, product):
     try:
         model.monomers[product]
     except:
@@ -29,6 +30,7 @@ class SoSFeedback(object):
     def __init__(self):
         self.run_time = 300
         self.tspan = np.linspace(0, self.run_time)
+        self.backend = "python"
 
         self.sos = [round(i) for i in np.linspace(25, 500, num=40)]
 
@@ -55,7 +57,7 @@ class SoSFeedback(object):
         Parameter('k_sos_off_rgdp', 3.0)
 
         product = "Sos_Ras_GDP"
-        add_new_monomer(product)
+        add_new_monomer(self.model, product)
 
         Rule('{0}_bind'.format(product), Sos() + Ras_GDP() | eval('{0}()'.format(product)),
              k_sos_on_rgdp, k_sos_off_rgdp)
@@ -68,7 +70,7 @@ class SoSFeedback(object):
         Parameter('k_sos_off_rgtp', 0.4)
 
         product = "Sos_Ras_GTP"
-        add_new_monomer(product)
+        add_new_monomer(self.model, product)
 
         Rule('{0}_bind'.format(product), Sos() + Ras_GTP() | eval('{0}()'.format(product)),
              k_sos_on_rgtp, k_sos_off_rgtp)
@@ -85,7 +87,7 @@ class SoSFeedback(object):
         previous_product = self.add_step_2()
 
         product = "Sos_Ras_GTP_Ras_GDP"
-        add_new_monomer(product)
+        add_new_monomer(self.model, product)
 
         Rule('{0}_bind'.format(product),
              eval('{0}()'.format(previous_product)) + Ras_GDP() | eval('{0}()'.format(product)),
@@ -103,7 +105,7 @@ class SoSFeedback(object):
         previous_product = self.add_step_1()
 
         product = "Sos_Ras_GDP_Ras_GDP"
-        add_new_monomer(product)
+        add_new_monomer(self.model, product)
 
         Rule('{0}_bind'.format(product),
              eval('{0}()'.format(previous_product)) + Ras_GDP() | eval('{0}()'.format(product)),
@@ -119,7 +121,7 @@ class SoSFeedback(object):
         Parameter('k_cat_5', 0.1)
 
         product = "Ras_GAP_Ras_GTP"
-        add_new_monomer(product)
+        add_new_monomer(self.model, product)
 
         Rule('{0}_bind'.format(product),
              Ras_GAP() + Ras_GTP() | eval('{0}()'.format(product)),
@@ -149,27 +151,28 @@ class SoSFeedback(object):
 
         return observables
 
-    def main(self):
-        sos_array = []
-        output = []
+    def solve_ligand(self, sos, observables):
+        self.model.parameters['Sos_0'].value = sos
+        y = solve_ode(self.model, self.tspan, backend=self.backend)
+
+        return y[observables[0]][-1]
+
+    def main(self, workers=1):
         observables = self.make_model()
 
         write_columns(observables)
-        write_model_attributes(model.rules, "rules")
-        write_model_attributes(model.parameters, "parameters")
-        write_model_attributes(model.observables, "observables")
+        write_model_attributes(self.model.rules, "rules")
+        write_model_attributes(self.model.parameters, "parameters")
+        write_model_attributes(self.model.observables, "observables")
 
         np.savetxt("time", self.tspan, fmt='%f')
 
-        for sos in self.sos:
-            model.parameters['Sos_0'].value = sos
-            y = odesolve(model, self.tspan, compiler="python")
-
-            sos_array.append(sos)
-            # print(y[observables[0]][-1])
-            output.append(y[observables[0]][-1])
+        if workers > 1:
+            output = parallel_sweep(self.__class__, {}, self.sos, workers, attributes={'backend': self.backend})
+        else:
+            output = [self.solve_ligand(sos, observables) for sos in self.sos]
 
-        df = pd.DataFrame({'Sos': sos_array, 'RasGTP': output})
+        df = pd.DataFrame({'Sos': self.sos, 'RasGTP': output})
         df.to_csv("./sos_rasgtp", sep='\t')
 
         # np.savetxt("Sos", sos_array, fmt='%f')
@@ -213,6 +216,10 @@ if __name__ == "__main__":
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--run', action='store_true', default=False,
                         help='Flag for submitting simulations.')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='Number of processes the Sos sweep is spread over.')
+    parser.add_argument('--backend', dest='backend', action='store', choices=BACKENDS, default="python",
+                        help='ODE backend; compiled caches a native right-hand side and Jacobian per model structure.')
 
     args = parser.parse_args()
 
@@ -223,4 +230,5 @@ if __name__ == "__main__":
         qsub.launch()
     else:
         sos = SoSFeedback()
-        sos.main()
+        sos.backend = args.backend
+        sos.main(workers=args.workers)
@@ -3,12 +3,19 @@
 import argparse
 import os
 import pickle
+import tempfile
 
 import numpy as np
 from pysb import *
-from pysb.integrate import odesolve
 
+from src.data.compiled_backend import BACKENDS, solve_observables, solve_ode
+from src.data.hybrid_simulation import HybridSimulator
+from src.data.linear_noise import LinearNoiseApproximation
+from src.data.mass_action_network import from_pysb_model
+from src.data.model_cache import ModelCache
 from src.data.simulation_parameters import InitialConcentrations, BindingParameters
+from src.data.steady_state import SteadyStateSolver
+from src.general.parallel_sweep import iterate_parallel_sweep
 
 
 def e(i, s=""):
@@ -43,6 +50,26 @@ def write_model_attributes(attributes, file_name):
     f.close()
 
 
+checkpoint_file = "sweep_checkpoint.pickle"
+
+
+def write_checkpoint(checkpoint):
+    '''Written under a temporary name and renamed into place, so a job killed mid-write leaves the last checkpoint.'''
+    pickle_out = tempfile.NamedTemporaryFile(suffix=".pickle", dir=".", delete=False)
+    pickle.dump(checkpoint, pickle_out)
+    pickle_out.close()
+    os.rename(pickle_out.name, checkpoint_file)
+
+
+def remove_checkpoint():
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+# Names used in parameters.pickle that differ from the name of the model parameter they set (see add_step_8_sos)
+parameter_aliases = {'k_8_1': 'k_sos_on'}
+
+
 class PysbTcrSelfWithForeign(object):
     def __init__(self, steps=8, self_foreign=False, lf=30):
         self.rate_constants = BindingParameters()
@@ -55,6 +82,11 @@ class PysbTcrSelfWithForeign(object):
 
         self.run_time = 1000
         self.tspan = np.linspace(0, self.run_time)
+        self.backend = "python"
+        self.model_cache = False
+        self.resume = False
+        self.sparse_output = False
+        self.checkpoint_interval = 50
 
         self.mu = 6
         self.sigma = 1.0
@@ -618,72 +650,168 @@ class PysbTcrSelfWithForeign(object):
 
         return observables
 
-    def main_truncated_time(self):
-        output = []
-        ligand_array = []
-        observables = self.make_model()
-
+    def write_model_files(self, observables):
         write_columns(observables)
         write_model_attributes(self.model.rules, "rules")
         write_model_attributes(self.model.parameters, "parameters")
         write_model_attributes(self.model.observables, "observables")
 
-        np.savetxt("time", self.tspan, fmt='%f')
-        time_index = 2
+    def solve_ligand(self, ligand, observables, time_index=-1):
+        self.model.parameters['Ls_0'].value = ligand
 
-        for ligand in self.p_ligand:
-            self.model.parameters['Ls_0'].value = ligand
-            ligand_array.append(ligand)
+        if self.sparse_output and self.num_samples > 1:
+            y = solve_observables(self.model, self.tspan[[0, time_index]], observables[:2], backend=self.backend)
+            return np.sum(y[-1])
 
-            y = odesolve(self.model, self.tspan, compiler="python")
+        y = solve_ode(self.model, self.tspan, backend=self.backend)
 
-            if len(observables) > 1:
-                output_array = y[observables[0]] + y[observables[1]]
-                if self.num_samples == 1:
-                    np.savetxt("{0}_output".format(observables[0]), y[observables[0]], fmt='%f')
-                    np.savetxt("{0}_output".format(observables[1]), y[observables[1]], fmt='%f')
-                    np.savetxt("output_array", output_array, fmt='%f')
+        if len(observables) > 1:
+            output_array = y[observables[0]] + y[observables[1]]
+            if self.num_samples == 1:
+                np.savetxt("{0}_output".format(observables[0]), y[observables[0]], fmt='%f')
+                np.savetxt("{0}_output".format(observables[1]), y[observables[1]], fmt='%f')
+                np.savetxt("output_array", output_array, fmt='%f')
+        else:
+            output_array = y[observables[0]]
 
-                output.append(output_array[time_index])
-            else:
-                output_array = y[observables[0]]
-                output.append(output_array[time_index])
+        return output_array[time_index]
+
+    def solve_samples(self, samples, observables, workers=1, time_index=-1):
+        if workers > 1:
+            init_kwargs = {'steps': self.steps, 'self_foreign': self.self_foreign, 'lf': self.lf}
+            attributes = {'backend': self.backend, 'sparse_output': self.sparse_output,
+                          'num_samples': self.num_samples}
+            return iterate_parallel_sweep(self.__class__, init_kwargs, samples, workers, time_index,
+                                          attributes=attributes)
+
+        return (self.solve_ligand(ligand, observables, time_index=time_index) for ligand in samples)
+
+    def sweep(self, observables, workers=1, time_index=-1):
+        '''Outputs for every ligand in p_ligand. The ligands and completed outputs are checkpointed every
+        checkpoint_interval samples; with resume set, a run restarts from the checkpoint and reuses its ligands.'''
+        output = []
+        if self.resume and os.path.exists(checkpoint_file):
+            checkpoint = pickle.load(open(checkpoint_file, "rb"))
+            if checkpoint['time_index'] == time_index:
+                self.p_ligand = checkpoint['p_ligand']
+                output = checkpoint['output']
+                print("Resuming from sample {0} of {1}".format(len(output), len(self.p_ligand)))
+
+        for ligand_output in self.solve_samples(self.p_ligand[len(output):], observables, workers=workers,
+                                                time_index=time_index):
+            output.append(ligand_output)
+            if len(output) % self.checkpoint_interval == 0:
+                write_checkpoint({'p_ligand': self.p_ligand, 'time_index': time_index, 'output': output})
+
+        return output
+
+    def main_truncated_time(self, workers=1):
+        observables = self.make_model()
+
+        self.write_model_files(observables)
+
+        np.savetxt("time", self.tspan, fmt='%f')
+        time_index = 2
+
+        output = self.sweep(observables, workers=workers, time_index=time_index)
 
         np.savetxt("truncated_time", [self.tspan[time_index]], fmt='%f')
-        np.savetxt("Ligand_concentrations", ligand_array, fmt='%f')
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
         np.savetxt("output", output, fmt='%f')
+        remove_checkpoint()
 
-    def main(self):
-        output = []
-        ligand_array = []
+    def main(self, workers=1):
         observables = self.make_model()
 
-        write_columns(observables)
-        write_model_attributes(self.model.rules, "rules")
-        write_model_attributes(self.model.parameters, "parameters")
-        write_model_attributes(self.model.observables, "observables")
+        self.write_model_files(observables)
 
         np.savetxt("time", self.tspan, fmt='%f')
 
-        for ligand in self.p_ligand:
-            self.model.parameters['Ls_0'].value = ligand
-            ligand_array.append(ligand)
+        output = self.sweep(observables, workers=workers)
 
-            y = odesolve(self.model, self.tspan, compiler="python")
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
+        np.savetxt("output", output, fmt='%f')
+        remove_checkpoint()
+
+    def build_network(self):
+        '''Builds the model and expands it into a MassActionNetwork, writing the model files of this run. With
+        model_cache set, a network built earlier for the same class, steps, lf and parameters is loaded instead
+        and neither make_model nor BioNetGen run.'''
+        cache = ModelCache()
+        key = cache.key(self) if self.model_cache else None
+        entry = cache.load(key) if self.model_cache else None
+
+        if entry is None:
+            observables = self.make_model()
+            entry = {'network': from_pysb_model(self.model),
+                     'observables': observables,
+                     'rules': [str(rule) for rule in self.model.rules],
+                     'parameters': [str(parameter) for parameter in self.model.parameters],
+                     'model_observables': [str(observable) for observable in self.model.observables]}
+            if self.model_cache:
+                cache.store(key, entry)
+
+        write_columns(entry['observables'])
+        write_model_attributes(entry['rules'], "rules")
+        write_model_attributes(entry['parameters'], "parameters")
+        write_model_attributes(entry['model_observables'], "observables")
+
+        return entry['network'], entry['observables']
+
+    def main_batched(self):
+        network, observables = self.build_network()
 
-            if len(observables) > 1:
-                output_array = y[observables[0]] + y[observables[1]]
-                if self.num_samples == 1:
-                    np.savetxt("{0}_output".format(observables[0]), y[observables[0]], fmt='%f')
-                    np.savetxt("{0}_output".format(observables[1]), y[observables[1]], fmt='%f')
-                    np.savetxt("output_array", output_array, fmt='%f')
+        np.savetxt("time", self.tspan, fmt='%f')
 
-                output.append(output_array[-1])
-            else:
-                output_array = y[observables[0]]
-                output.append(output_array[-1])
+        # Full trajectories are only written for a single sample; otherwise record the end point alone
+        times = self.tspan if self.num_samples == 1 else self.tspan[[0, -1]]
+        y = network.integrate(network.initial_states('Ls_0', self.p_ligand), times, observables=observables[:2])
+
+        output_array = np.sum(y, axis=2)
+        if self.num_samples == 1 and len(observables) > 1:
+            np.savetxt("{0}_output".format(observables[0]), y[0, :, 0], fmt='%f')
+            np.savetxt("{0}_output".format(observables[1]), y[0, :, 1], fmt='%f')
+            np.savetxt("output_array", output_array[0], fmt='%f')
+
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
+        np.savetxt("output", output_array[:, -1], fmt='%f')
+
+    def main_steady_state(self):
+        network, observables = self.build_network()
+        solver = SteadyStateSolver(network)
+        steady_states = solver.solve_sweep('Ls_0', self.p_ligand, self.run_time)
+        print("Newton converged for {0} samples, {1} integrated".format(solver.num_newton, solver.num_integrated))
 
-        np.savetxt("Ligand_concentrations", ligand_array, fmt='%f')
+        output = sum(network.observable(steady_states, name) for name in observables[:2])
+
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
+        np.savetxt("output", output, fmt='%f')
+
+    def main_lna(self):
+        '''Steady-state output and its intrinsic variance under the linear noise approximation for every sample.'''
+        network, observables = self.build_network()
+        k = network.rate_constants()
+        steady_states = SteadyStateSolver(network).solve_sweep('Ls_0', self.p_ligand, self.run_time, k=k)
+
+        output = sum(network.observable(steady_states, name) for name in observables[:2])
+        output_variance = LinearNoiseApproximation(network).output_variance(steady_states, observables[:2], k=k)
+
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
+        np.savetxt("output", output, fmt='%f')
+        np.savetxt("output_variance", output_variance, fmt='%f')
+
+    def main_hybrid(self, threshold=100, time_step=0.1):
+        '''One stochastic trajectory per ligand sample with the hybrid ODE/SSA engine, repartitioned every time_step;
+        the output is the copy number of the output observables at the end of the run.'''
+        network, observables = self.build_network()
+        simulator = HybridSimulator(network, threshold=threshold, time_step=time_step)
+        k = network.rate_constants()
+
+        y = np.array([simulator.simulate(y0, [self.run_time], k=k)[-1]
+                      for y0 in network.initial_states('Ls_0', self.p_ligand)])
+        output = sum(network.observable(y, name) for name in observables[:2])
+
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
         np.savetxt("output", output, fmt='%f')
 
 
@@ -1166,9 +1294,39 @@ if __name__ == "__main__":
                         help='Flag for building and submitting early positive feedback loop.')
     parser.add_argument('--latpp_ext', dest='latpp_ext', action='store_true', default=False,
                         help='Building network with latpp attached to TCR complex.')
+    parser.add_argument('--batch', dest='batch', action='store_true', default=False,
+                        help='Integrate all ligand samples as one vectorized ODE system.')
+    parser.add_argument('--steady-state', dest='steady_state', action='store_true', default=False,
+                        help='Solve for the steady state of each sample directly instead of integrating.')
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='Number of processes the ligand sweep is spread over.')
+    parser.add_argument('--seed', dest='seed', action='store', type=int, help='Seed for the ligand samples.')
+    parser.add_argument('--backend', dest='backend', action='store', choices=BACKENDS, default="python",
+                        help='ODE backend; compiled caches a native right-hand side and Jacobian per model structure.')
+    parser.add_argument('--model-cache', dest='model_cache', action='store_true', default=False,
+                        help='Reuse the expanded network of an identical earlier build in --batch/--steady-state runs.')
+    parser.add_argument('--sparse-output', dest='sparse_output', action='store_true', default=False,
+                        help='Record only the output observables at the time point used, not full trajectories.')
+    parser.add_argument('--resume', dest='resume', action='store_true', default=False,
+                        help='Continue the ligand sweep from its last checkpoint.')
+    parser.add_argument('--checkpoint-interval', dest='checkpoint_interval', action='store', type=int, default=50,
+                        help='Number of samples between checkpoints of the ligand sweep.')
+    parser.add_argument('--lna', dest='lna', action='store_true', default=False,
+                        help='Write the steady-state output variance of each sample under the linear noise '
+                             'approximation.')
+    parser.add_argument('--hybrid', dest='hybrid', action='store_true', default=False,
+                        help='Simulate each sample stochastically, integrating species above --threshold copies '
+                             'as ODEs.')
+    parser.add_argument('--threshold', dest='threshold', action='store', type=int, default=100,
+                        help='Copy number above which a species is treated as continuous in --hybrid runs.')
+    parser.add_argument('--partition-step', dest='partition_step', action='store', type=float, default=0.1,
+                        help='Time between repartitions of the species in --hybrid runs.')
 
     args = parser.parse_args()
 
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
     if args.lf:
         if args.early_pos_fb:
             tcr = EarlyPositiveFeedback(steps=args.steps, self_foreign=True, lf=args.lf)
@@ -1189,7 +1347,22 @@ if __name__ == "__main__":
         else:
             tcr = PysbTcrSelfWithForeign(steps=args.steps)
 
-    tcr.main()
+    tcr.backend = args.backend
+    tcr.model_cache = args.model_cache
+    tcr.resume = args.resume
+    tcr.sparse_output = args.sparse_output
+    tcr.checkpoint_interval = args.checkpoint_interval
+
+    if args.batch:
+        tcr.main_batched()
+    elif args.steady_state:
+        tcr.main_steady_state()
+    elif args.lna:
+        tcr.main_lna()
+    elif args.hybrid:
+        tcr.main_hybrid(threshold=args.threshold, time_step=args.partition_step)
+    else:
+        tcr.main(workers=args.workers)
 
 ## Uncomment to make reaction network
 
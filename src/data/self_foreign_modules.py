@@ -5,6 +5,11 @@ import subprocess
 import numpy as np
 
 from simulation_parameters import DefineRegion
+from src.data.simulate_network import initial_counts_file, network_file
+from src.data.simulate_network import moments, recording_times, simulate, write_moments
+from src.data.single_molecule import SingleMoleculeSimulator, total_output
+from src.data.spatial_simulation import NextSubvolumeMethod
+from src.data.stochastic_simulation import from_ssc_model
 
 
 class SharedCommands(object):
@@ -288,6 +293,10 @@ class KPSingleSpecies(object):
         self.run_time = 100
         self.simulation_time = 2
         self.single_molecule = False
+        self.native = False
+        self.ssa_method = "ensemble"
+        self.spatial = False
+        self.compile_once = False
 
         self.home_directory = os.getcwd()
 
@@ -388,11 +397,60 @@ class KPSingleSpecies(object):
             q.write("python ~/SSC_python_modules/plot.py \n")
         q.close()
 
+    def generate_network_qsub(self, simulation_name, time_step, ls=500):
+        '''qsub.sh running the sample from the condition's pickled network and this directory's initial_counts.'''
+        q = open("qsub.sh", "w")
+        q.write("#PBS -m ae\n")
+        q.write("#PBS -q short\n")
+        q.write("#PBS -V\n")
+        q.write("#PBS -l walltime={1},nodes=1:ppn=1 -N {0}\n\n".format(simulation_name,
+                                                                       datetime.timedelta(
+                                                                           minutes=self.set_simulation_time(ls=ls))))
+        q.write("cd $PBS_O_WORKDIR\n\n")
+        q.write("echo $PBS_JOBID > job_id\n")
+        q.write("RUN_TIME={0}\n".format(self.run_time))
+        q.write("STEP={0}\n\n".format(time_step))
+        q.write("python -m src.data.simulate_network --network ../{0} --initial_counts {1} --num_files {2} "
+                "--run_time $RUN_TIME --time_step $STEP --ssa_method {3}\n".format(network_file, initial_counts_file,
+                                                                                   self.num_files, self.ssa_method))
+        q.close()
+
     def generate(self, simulation_name, time_step, ls=500):
         self.generate_ssc_script(simulation_name)
         compile_script(simulation_name + ".rxn")
         self.generate_qsub(simulation_name, time_step, ls=ls)
 
+    def simulate_native(self, network, time_step):
+        '''In-process replacement of the compiled SSC executable and post_process.py: runs num_files trajectories and
+        writes column_names, mean_traj and var_traj (time first, then the recorded species), as simulate_network does
+        for a compile_once sample. With spatial set the trajectories are simulated on the membrane region with the
+        next-subvolume method. With single_molecule set each ligand molecule is tracked, and total_output plus the final
+        ligand species of every molecule (molecule_states, one row per trajectory) are written as well.'''
+        if not (self.spatial or self.single_molecule):
+            simulate(network, self.ligand.record, self.ligand.n_initial, self.run_time, time_step, self.num_files,
+                     ssa_method=self.ssa_method)
+            return
+
+        times = recording_times(self.run_time, time_step)
+        record = [network.species_index(name) for name in self.ligand.record]
+        initial_counts = network.initial_counts(self.ligand.n_initial)
+
+        if self.spatial:
+            simulator = NextSubvolumeMethod.from_ligand(network, self.ligand, region=self.regions)
+            trajectories = [simulator.simulate(initial_counts, times, record=record) for j in range(self.num_files)]
+        else:
+            simulator = SingleMoleculeSimulator(network)
+            trajectories, molecule_states = zip(*[simulator.simulate(initial_counts, times, record=record,
+                                                                     record_molecules=True)
+                                                  for j in range(self.num_files)])
+            np.savetxt("molecule_states", [states[-1] for states in molecule_states], fmt="%d")
+
+        mean, variance = moments(trajectories)
+        if self.single_molecule:
+            np.savetxt("total_output", total_output(times, mean, self.ligand.record), fmt="%1.3f")
+
+        write_moments(times, mean, variance, self.ligand.record)
+
     def single_add_step(self):
         self.num_kp_steps += 1
         self.ligand.simulation_name = "kp_steps_" + str(self.num_kp_steps)
@@ -436,6 +494,9 @@ class KPSingleSpecies(object):
 
     def main_script(self, run=False):
         sample = []
+        if self.native:
+            network = from_ssc_model(self.ligand)
+
         for i in range(self.ligand.num_samples):
             directory = "sample_" + str(i)
             s = self.ligand.p_ligand[i]
@@ -451,10 +512,13 @@ class KPSingleSpecies(object):
             if self.ligand.num_kp_steps > 6:
                 self.run_time = 1000
 
-            self.generate(simulation_name, self.set_time_step())
-            if run:
-                (stdout, stderr) = subprocess.Popen(["qsub {0}".format("qsub.sh")], shell=True, stdout=subprocess.PIPE,
-                                                    cwd=os.getcwd()).communicate()
+            if self.native:
+                self.simulate_native(network, self.set_time_step())
+            else:
+                self.generate(simulation_name, self.set_time_step())
+                if run:
+                    (stdout, stderr) = subprocess.Popen(["qsub {0}".format("qsub.sh")], shell=True,
+                                                        stdout=subprocess.PIPE, cwd=os.getcwd()).communicate()
             os.chdir(self.home_directory)
 
         np.savetxt("Ligand_concentrations", sample, fmt='%f')
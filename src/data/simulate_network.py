@@ -0,0 +1,88 @@
+'''Runs the trajectories of one ligand sample from a network built once per condition. KPRealistic.main_script
+pickles the ReactionNetwork (with the species to record) in the condition directory and writes only an initial_counts
+file and a qsub.sh calling this module into each sample directory, so no per-sample .rxn script or SSC executable is
+compiled. Writes column_names, mean_traj and var_traj like the SSC executable followed by post_process.py.'''
+
+import argparse
+import pickle
+
+import numpy as np
+
+from src.data.stochastic_simulation import methods
+
+network_file = "network.pickle"
+initial_counts_file = "initial_counts"
+
+
+def write_network(network, record, filename=network_file):
+    pickle_out = open(filename, "wb")
+    pickle.dump({'network': network, 'record': record}, pickle_out)
+    pickle_out.close()
+
+
+def write_initial_counts(n_initial, filename=initial_counts_file):
+    f = open(filename, "w")
+    for key, value in n_initial.items():
+        f.write("{0} {1}\n".format(key, value))
+    f.close()
+
+
+def read_initial_counts(filename=initial_counts_file):
+    n_initial = {}
+    for line in open(filename).readlines():
+        key, value = line.split()
+        n_initial[key] = int(value)
+    return n_initial
+
+
+def recording_times(run_time, time_step):
+    return time_step * np.arange(1, int(round(run_time / time_step)) + 1)
+
+
+def moments(trajectories):
+    '''Mean and variance over trajectories at every recording time, as post_process.py computes them.'''
+    return np.mean(trajectories, axis=0), np.var(trajectories, axis=0, ddof=1 if len(trajectories) > 1 else 0)
+
+
+def write_moments(times, mean, variance, record_names):
+    f = open("column_names", "w")
+    for item in ["time"] + record_names:
+        f.write("{0} ".format(item))
+    f.write("\n")
+    f.close()
+
+    np.savetxt("mean_traj", np.column_stack([times, mean]), fmt="%f")
+    np.savetxt("var_traj", np.column_stack([times, variance]), fmt="%f")
+
+
+def simulate(network, record_names, n_initial, run_time, time_step, num_files, ssa_method="ensemble"):
+    times = recording_times(run_time, time_step)
+    record = [network.species_index(name) for name in record_names]
+    initial_counts = network.initial_counts(n_initial)
+
+    simulator = methods[ssa_method](network)
+    if ssa_method == "ensemble":
+        mean, variance = simulator.simulate(initial_counts, times, num_files, record=record)
+    else:
+        mean, variance = moments([simulator.simulate(initial_counts, times, record=record) for j in range(num_files)])
+
+    write_moments(times, mean, variance, record_names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulating one ligand sample of a pickled network",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--network', dest='network', action='store', default="../" + network_file,
+                        help="Pickled network of the condition.")
+    parser.add_argument('--initial_counts', dest='initial_counts', action='store', default=initial_counts_file,
+                        help="Initial counts of this sample.")
+    parser.add_argument('--run_time', dest='run_time', action='store', type=float, help="Simulation end time.")
+    parser.add_argument('--time_step', dest='time_step', action='store', type=float, help="Recording interval.")
+    parser.add_argument('--num_files', dest='num_files', action='store', type=int, help="Number of trajectories.")
+    parser.add_argument('--ssa_method', dest='ssa_method', action='store', choices=sorted(methods),
+                        default="ensemble", help="Stochastic simulation algorithm.")
+    args = parser.parse_args()
+
+    entry = pickle.load(open(args.network, "rb"))
+    simulate(entry['network'], entry['record'], read_initial_counts(args.initial_counts), args.run_time,
+             args.time_step, args.num_files, ssa_method=args.ssa_method)
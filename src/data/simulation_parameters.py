@@ -215,3 +215,11 @@ class MembraneBindingParameters(object):
 
         self.k_p_on_zap_species = self.on_rate  # / 10.0
         self.k_p_off_zap_species = 0.1  # self.k_p_off_R_pmhc
+
+        # LAT binding and phosphorylation - steps 6 to 8
+        self.k_lat_on_species = (self.on_rate / self.initial.lat_0) * self.region.num_chambers
+        self.k_lat_off_species = self.rates.k_lat_off_species
+
+        self.k_p_lat_1 = self.rates.k_p_lat_1
+        self.k_p_lat_2 = self.rates.k_p_lat_2
+        self.k_p_lat_off_species = self.rates.k_p_lat_off_species
@@ -0,0 +1,107 @@
+'''Single-molecule KP simulation without one species per ligand molecule. Ligand molecules of the same kind are
+kinetically identical, so the network only needs the aggregated species (Ls, RLs, RLs_Lck, ...). Each molecule's
+identity is kept in a state array holding the index of the ligand species it is currently part of; when a reaction
+consumes a ligand species, a molecule chosen uniformly among those in that species moves to the ligand product. Memory
+is linear in the number of molecules and the network does not grow with the ligand count.'''
+
+import numpy as np
+
+
+class SingleMoleculeSimulator(object):
+    def __init__(self, network, ligand_names=("Lf", "Ls"), block_size=4096):
+        self.network = network
+        self.ligand_names = list(ligand_names)
+        self.block_size = block_size
+
+        # Ligand kind of every species (-1 for species without a ligand, e.g. R, Lck, Zap)
+        self.kind = np.array([next((k for k, name in enumerate(self.ligand_names) if name in species), -1)
+                              for species in network.species])
+
+        # The ligand species each reaction consumes and produces (-1 for reactions that move no ligand molecule,
+        # including those where a ligand complex only acts as a catalyst)
+        self.carrier = np.full(network.num_reactions, -1, dtype=int)
+        self.product = np.full(network.num_reactions, -1, dtype=int)
+        for j in range(network.num_reactions):
+            consumed = [s for s in np.nonzero(network.stoichiometry[:, j] < 0)[0] if self.kind[s] >= 0]
+            produced = [s for s in np.nonzero(network.stoichiometry[:, j] > 0)[0] if self.kind[s] >= 0]
+            if len(consumed) > 1 or len(produced) != len(consumed):
+                raise ValueError("Reaction {0} does not move a single ligand molecule".format(j))
+            if consumed:
+                self.carrier[j] = consumed[0]
+                self.product[j] = produced[0]
+
+    def random_numbers(self):
+        while True:
+            for u in np.random.random((self.block_size, 3)):
+                yield u[0], u[1], u[2]
+
+    def simulate(self, initial_counts, times, record=None, record_molecules=False):
+        '''Same interface as GillespieDirect.simulate. With record_molecules, also returns the ligand species of every
+        molecule at each time, shape (len(times), n_molecules), molecules ordered by their initial species.'''
+        network = self.network
+        if record is None:
+            record = np.arange(network.num_species)
+
+        state = network.extend(initial_counts)
+        a = network.propensities(state)
+        output = np.zeros((len(times), len(record)), dtype=np.int64)
+        random_numbers = self.random_numbers()
+
+        molecules = np.repeat(np.nonzero(self.kind >= 0)[0], state[:-1][self.kind >= 0])
+        dtype = np.int16 if network.num_species < np.iinfo(np.int16).max else np.int32
+        molecules = molecules.astype(dtype)
+        molecule_output = np.zeros((len(times), len(molecules)), dtype=dtype) if record_molecules else None
+
+        # Molecules currently in each ligand species, in no particular order
+        members = [[] for s in range(network.num_species)]
+        for m, s in enumerate(molecules):
+            members[s].append(m)
+
+        t = 0.0
+        i = 0
+        while i < len(times):
+            a0 = a.sum()
+            u_time, u_reaction, u_molecule = next(random_numbers)
+            tau = -np.log(1.0 - u_time) / a0 if a0 > 0 else np.inf
+
+            while i < len(times) and times[i] < t + tau:
+                output[i] = state[record]
+                if record_molecules:
+                    molecule_output[i] = molecules
+                i += 1
+            if i == len(times):
+                break
+
+            t += tau
+            j = min(np.searchsorted(np.cumsum(a), u_reaction * a0, side='right'), network.num_reactions - 1)
+            state[network.changed_species[j]] += network.changes[j]
+            dependencies = network.dependencies[j]
+            a[dependencies] = network.propensities(state, dependencies)
+
+            carrier = self.carrier[j]
+            if carrier >= 0:
+                source = members[carrier]
+                k = int(u_molecule * len(source))
+                m = source[k]
+                source[k] = source[-1]
+                source.pop()
+                members[self.product[j]].append(m)
+                molecules[m] = self.product[j]
+
+        if record_molecules:
+            return output, molecule_output
+        return output
+
+
+def total_output(times, mean, record_names):
+    '''time, first recorded species, and the summed Lf and Ls recorded species, as PostProcessSingleMolecule writes to
+    total_output from the per-molecule SSC columns.'''
+    lf_output = np.zeros(len(times))
+    ls_output = np.zeros(len(times))
+    for column, name in enumerate(record_names):
+        if "Lf" in name:
+            lf_output += mean[:, column]
+        if "Ls" in name:
+            ls_output += mean[:, column]
+
+    return np.c_[times, mean[:, 0], lf_output, ls_output]
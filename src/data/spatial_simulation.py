@@ -0,0 +1,185 @@
+'''Native next-subvolume method (NSM) for the membrane region models. The Plasma slab and the Cytosol below it, as laid
+out by DefineRegion, are split into cubic subvolumes of edge subvolume_edge. Each subvolume holds integer counts and is
+well mixed; molecules hop to a face neighbour at rate D / edge^2. Plasma species stay in the Plasma layers, Cytosol
+species (e.g. Zap) move through both regions as in SSC's "Cytosol<->Plasma" diffusion, and species without a diffusion
+rate stay where they are made. Every subvolume keeps the time of its next event in an indexed priority queue, so an
+event costs O(log n_subvolumes) plus the propensities of the one or two subvolumes it changes.
+
+Rate constants are read per unit volume as in SSC, so membrane models should use MembraneBindingParameters, whose
+bimolecular rates are scaled by the number of chambers; the ssc_reaction_network ligands do so when built with
+--spatial.'''
+
+import numpy as np
+
+from src.data.simulation_parameters import DefineRegion
+from src.data.stochastic_simulation import ReactionNetwork, IndexedPriorityQueue
+
+
+class SubvolumeLattice(object):
+    def __init__(self, region=None):
+        region = region or DefineRegion()
+        self.edge = region.subvolume_edge
+        self.volume = self.edge ** 3
+
+        self.nx = int(round(region.x / self.edge))
+        self.ny = int(round(region.y / self.edge))
+        self.plasma_layers = int(round(region.depth / self.edge))
+        self.cytosol_layers = int(round(region.cytosol_depth / self.edge))
+        self.nz = self.plasma_layers + self.cytosol_layers
+
+        # Subvolume x + nx (y + ny z); layers z < plasma_layers are Plasma, the rest Cytosol
+        self.num_plasma = self.nx * self.ny * self.plasma_layers
+        self.num_subvolumes = self.nx * self.ny * self.nz
+
+        self.neighbors = {"Plasma": self.neighbor_lists(self.plasma_layers), "Cytosol": self.neighbor_lists(self.nz)}
+
+    def neighbor_lists(self, layers):
+        '''Face neighbours of every subvolume within the first layers z-layers (reflecting walls); subvolumes outside
+        them have none.'''
+        neighbors = []
+        for v in range(self.num_subvolumes):
+            x, y, z = v % self.nx, (v // self.nx) % self.ny, v // (self.nx * self.ny)
+            adjacent = []
+            if z < layers:
+                for dx, dy, dz in [(-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1)]:
+                    if 0 <= x + dx < self.nx and 0 <= y + dy < self.ny and 0 <= z + dz < layers:
+                        adjacent.append(x + dx + self.nx * (y + dy + self.ny * (z + dz)))
+            neighbors.append(adjacent)
+
+        return neighbors
+
+    def subvolumes(self, location):
+        if location == "Plasma":
+            return np.arange(self.num_plasma)
+        return np.arange(self.num_plasma, self.num_subvolumes)
+
+
+class NextSubvolumeMethod(object):
+    def __init__(self, network, lattice=None, diffusion_rates=None, locations=None, block_size=4096):
+        self.lattice = lattice or SubvolumeLattice()
+        self.block_size = block_size
+
+        # Propensities per subvolume: a reaction of order m has rate constant k / volume^(m - 1)
+        order = np.sum(network.reactants < network.num_species, axis=1)
+        self.network = ReactionNetwork(network.species, network.reactants, network.stoichiometry,
+                                       network.rate_constants * self.lattice.volume ** (1.0 - order))
+
+        diffusion_rates = diffusion_rates or {}
+        locations = locations or {}
+        species = self.network.species
+        self.locations = [locations.get(name, "Plasma") for name in species]
+        self.hop_rates = np.array([diffusion_rates.get(name, 0.0) / self.lattice.edge ** 2 for name in species])
+
+        # Diffusion propensity of a species in a subvolume is count * hop rate * number of neighbours it can reach
+        self.num_neighbors = np.array([[len(adjacent) for adjacent in self.lattice.neighbors[location]]
+                                       for location in self.locations], dtype=float).T
+        self.hop_totals = self.hop_rates * self.num_neighbors
+
+        # Reactant columns and offsets of the reactions updated after each event, gathered once rather than per event
+        consumers = [np.nonzero(np.any(self.network.reactants == s, axis=1))[0] for s in range(len(species))]
+        self.reaction_terms = [self.terms(dependencies) for dependencies in self.network.dependencies]
+        self.diffusion_terms = [self.terms(reactions) for reactions in consumers]
+
+    def terms(self, reactions):
+        network = self.network
+        return reactions, network.propensity_constants[reactions], network.reactants[reactions].T.copy(), \
+            network.offsets[reactions].T.copy()
+
+    @staticmethod
+    def propensities(counts, terms):
+        '''Propensities of the reactions of terms in one subvolume, or a stack of them.'''
+        reactions, a, reactants, offsets = terms
+        for columns, offset in zip(reactants, offsets):
+            a = a * np.maximum(counts[..., columns] - offset, 0)
+        return a
+
+    @classmethod
+    def from_ligand(cls, network, ligand, region=None):
+        '''Simulator for a TcrCycleSelfWithForeign-style ligand built with diffusion_flag set.'''
+        return cls(network, SubvolumeLattice(region), ligand.diffusion_rate_dict, ligand.diffusion_loc_dict)
+
+    def random_numbers(self):
+        while True:
+            for u in np.random.random((self.block_size, 3)):
+                yield u[0], u[1], u[2]
+
+    def place(self, initial_counts):
+        '''Per-subvolume counts, (n_subvolumes x n_species + 1) int32 with the trailing column of ones, with every
+        species spread uniformly over the subvolumes of its region.'''
+        counts = np.zeros((self.lattice.num_subvolumes, self.network.num_species + 1), dtype=np.int32)
+        counts[:, -1] = 1
+        for s, count in enumerate(initial_counts):
+            if count > 0:
+                subvolumes = self.lattice.subvolumes(self.locations[s])
+                counts[subvolumes, s] = np.random.multinomial(count, np.ones(len(subvolumes)) / len(subvolumes))
+        return counts
+
+    def simulate(self, initial_counts, times, record=None, record_subvolumes=False):
+        '''One trajectory from initial_counts (totals, spread by place) at time 0. Returns the total counts of the
+        record species at each of the increasing times, shape (len(times), n_record), and with record_subvolumes also
+        their per-subvolume counts, shape (len(times), n_subvolumes, n_record).'''
+        network = self.network
+        lattice = self.lattice
+        if record is None:
+            record = np.arange(network.num_species)
+
+        counts = self.place(initial_counts)
+        a = network.propensities(counts)
+        d = counts[:, :-1] * self.hop_totals
+        output = np.zeros((len(times), len(record)), dtype=np.int64)
+        subvolume_output = np.zeros((len(times), lattice.num_subvolumes, len(record)), dtype=np.int32) \
+            if record_subvolumes else None
+        random_numbers = self.random_numbers()
+
+        totals = list(a.sum(axis=1) + d.sum(axis=1))
+        with np.errstate(divide='ignore'):
+            queue = IndexedPriorityQueue(-np.log(1.0 - np.random.random(lattice.num_subvolumes)) / totals)
+
+        def reschedule(v, t, u):
+            totals[v] = float(a[v].sum() + d[v].sum())
+            queue.update(v, t - np.log(1.0 - u) / totals[v] if totals[v] > 0 else np.inf)
+
+        i = 0
+        while i < len(times):
+            v, t = queue.top()
+
+            while i < len(times) and times[i] < t:
+                output[i] = counts[:, record].sum(axis=0)
+                if record_subvolumes:
+                    subvolume_output[i] = counts[:, record]
+                i += 1
+            if i == len(times):
+                break
+
+            u_event, u_neighbor, u_time = next(random_numbers)
+            a_v = a[v]
+            reaction_total = a_v.sum()
+            r = u_event * totals[v]
+
+            if r < reaction_total:
+                j = min(np.searchsorted(np.cumsum(a_v), r, side='right'), network.num_reactions - 1)
+                species = network.changed_species[j]
+                counts[v, species] += network.changes[j]
+                terms = self.reaction_terms[j]
+                a_v[terms[0]] = self.propensities(counts[v], terms)
+                d[v, species] = counts[v, species] * self.hop_totals[v, species]
+            else:
+                s = min(np.searchsorted(np.cumsum(d[v]), r - reaction_total, side='right'), network.num_species - 1)
+                adjacent = lattice.neighbors[self.locations[s]][v]
+                w = adjacent[int(u_neighbor * len(adjacent))]
+                counts[v, s] -= 1
+                counts[w, s] += 1
+
+                terms = self.diffusion_terms[s]
+                a[v, terms[0]], a[w, terms[0]] = self.propensities(counts[[v, w]], terms)
+                d[v, s] = counts[v, s] * self.hop_totals[v, s]
+                d[w, s] = counts[w, s] * self.hop_totals[w, s]
+
+                # The neighbour's rates changed; by memorylessness it may simply draw a new event time
+                reschedule(w, t, np.random.random())
+
+            reschedule(v, t, u_time)
+
+        if record_subvolumes:
+            return output, subvolume_output
+        return output
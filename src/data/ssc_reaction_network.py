@@ -5,8 +5,11 @@ import time
 
 import numpy as np
 
-from simulation_parameters import InitialConcentrations, DiffusionRates, BindingParameters
+from simulation_parameters import InitialConcentrations, DiffusionRates, BindingParameters, \
+    MembraneBindingParameters, MembraneInitialConcentrations
 from src.data.self_foreign_modules import KPSingleSpecies
+from src.data.simulate_network import write_initial_counts, write_network
+from src.data.stochastic_simulation import from_ssc_model, methods
 from src.general.directory_handling import make_and_cd
 
 
@@ -48,6 +51,11 @@ class TcrCycleSelfWithForeign(TcrSelfWithForeign):
         self.initial = InitialConcentrations()
         self.diffusion_constants = DiffusionRates()
 
+        # On the membrane region rates are per subvolume, so bimolecular rates are scaled by the number of chambers
+        if self.arguments.spatial:
+            self.rate_constants = MembraneBindingParameters()
+            self.initial = MembraneInitialConcentrations()
+
         self.n_initial = {"R": self.initial.r_0, "Lf": self.arguments.ls_lf, "Ls": 1000}
 
         if self.arguments.steps > 0:
@@ -617,8 +625,12 @@ class KPRealistic(KPSingleSpecies):
         sample = []
         self.create_steps()
 
+        if self.native or self.compile_once:
+            network = from_ssc_model(self.ligand)
+        if self.compile_once:
+            write_network(network, self.ligand.record)
+
         for i in range(len(self.p_ligand)):
-            time.sleep(0.5)
             directory = "sample_" + str(i)
 
             s = self.p_ligand[i]
@@ -633,10 +645,18 @@ class KPRealistic(KPSingleSpecies):
             os.chdir(directory)
             print("Changed into directory: " + str(os.getcwd()))
 
-            self.generate(simulation_name, self.set_time_step(), ls=s)
-            if run:
-                (stdout, stderr) = subprocess.Popen(["qsub {0}".format("qsub.sh")], shell=True, stdout=subprocess.PIPE,
-                                                    cwd=os.getcwd()).communicate()
+            if self.native:
+                self.simulate_native(network, self.set_time_step())
+            else:
+                if self.compile_once:
+                    write_initial_counts(self.ligand.n_initial)
+                    self.generate_network_qsub(simulation_name, self.set_time_step(), ls=s)
+                else:
+                    self.generate(simulation_name, self.set_time_step(), ls=s)
+                if run:
+                    time.sleep(0.5)
+                    (stdout, stderr) = subprocess.Popen(["qsub {0}".format("qsub.sh")], shell=True,
+                                                        stdout=subprocess.PIPE, cwd=os.getcwd()).communicate()
             os.chdir(self.home_directory)
 
         print(str(self.ligand.record))
@@ -662,6 +682,17 @@ if __name__ == "__main__":
                         help="flag for submitting Ls calculations.")
     parser.add_argument('--ls_lf', dest='ls_lf', action='store', type=int, default=30,
                         help="number of foreign ligands.")
+    parser.add_argument('--native', action='store_true', default=False,
+                        help="Simulate in-process with the native SSA instead of compiling SSC executables.")
+    parser.add_argument('--ssa_method', dest='ssa_method', action='store', choices=sorted(methods),
+                        default="ensemble",
+                        help="Stochastic simulation algorithm of the native engine.")
+    parser.add_argument('--spatial', action='store_true', default=False,
+                        help="Simulate natively on the membrane region with the next-subvolume method.")
+    parser.add_argument('--compile_once', action='store_true', default=False,
+                        help="Build the network once and give each sample only its initial counts and a qsub script.")
+    parser.add_argument('--single_molecule', action='store_true', default=False,
+                        help="Simulate natively while tracking the KP state of every ligand molecule.")
     args = parser.parse_args()
 
     directory_name = "{0}_step".format(args.steps)
@@ -679,4 +710,10 @@ if __name__ == "__main__":
     else:
         raise Exception("Need to specify Ls or Ls_Lf")
 
+    kp.native = args.native or args.spatial or args.single_molecule
+    kp.single_molecule = args.single_molecule
+    kp.compile_once = args.compile_once
+    kp.ssa_method = args.ssa_method
+    kp.spatial = args.spatial
+    kp.ligand.diffusion_flag = args.spatial
     kp.main_script(run=args.run)
@@ -0,0 +1,118 @@
+'''Steady states of a MassActionNetwork by Newton's method. The rate equations made redundant by the conservation laws
+of the stoichiometry are replaced by the conservation laws themselves, so every Newton step is one square linear
+solve.'''
+
+import numpy as np
+import scipy.linalg
+
+
+def conservation_laws(stoichiometry):
+    '''Rows span the left null space of the stoichiometry matrix, i.e. laws.dot(stoichiometry) = 0.'''
+    return scipy.linalg.null_space(stoichiometry.T).T
+
+
+def independent_species(stoichiometry):
+    '''Indices of a maximal set of linearly independent rows of the stoichiometry matrix.'''
+    q, r, pivots = scipy.linalg.qr(stoichiometry.T, pivoting=True)
+    diagonal = np.abs(np.diag(r))
+    rank = int(np.sum(diagonal > 1e-10 * diagonal.max()))
+    return np.sort(pivots[:rank])
+
+
+def reduced_basis(stoichiometry):
+    '''Orthonormal basis of the stoichiometric subspace in which the dynamics of a fixed set of totals evolve.'''
+    return scipy.linalg.orth(stoichiometry)
+
+
+class SteadyStateSolver(object):
+    def __init__(self, network, rtol=1e-8, atol=1e-6, ftol=1e-6, max_iterations=50):
+        self.network = network
+        self.rtol = rtol
+        self.atol = atol
+        self.ftol = ftol
+        self.max_iterations = max_iterations
+
+        self.laws = conservation_laws(network.stoichiometry)
+        self.independent = independent_species(network.stoichiometry)
+        self.basis = reduced_basis(network.stoichiometry)
+
+        self.num_newton = 0
+        self.num_integrated = 0
+
+    def residual(self, y, totals, k):
+        return np.concatenate([self.network.rhs(y[None], k=k)[0][self.independent], self.laws.dot(y) - totals])
+
+    def is_stable(self, y, k):
+        jacobian = self.network.jacobian(y[None], k=k)[0]
+        reduced = self.basis.T.dot(jacobian).dot(self.basis)
+        return np.all(np.linalg.eigvals(reduced).real < 0)
+
+    def newton(self, y_guess, y0, k=None):
+        '''Solves f(y) = 0 subject to laws.dot(y) = laws.dot(y0). Returns (y, converged); converged needs both a step
+        within rtol and atol and a residual (rates and conservation laws) within ftol, as a heavily damped step can be
+        small far from a root.'''
+        if k is None:
+            k = self.network.rate_constants()
+
+        totals = self.laws.dot(y0)
+        y = y_guess.copy()
+        residual = self.residual(y, totals, k)
+
+        for iteration in range(self.max_iterations):
+            jacobian = np.concatenate([self.network.jacobian(y[None], k=k)[0][self.independent], self.laws])
+            try:
+                step = np.linalg.solve(jacobian, residual)
+            except np.linalg.LinAlgError:
+                return y, False
+
+            # Damp the step to keep concentrations non-negative and the residual decreasing
+            alpha = 1.0
+            while alpha > 1e-4:
+                y_new = y - alpha * step
+                if np.all(y_new >= -self.atol):
+                    residual_new = self.residual(y_new, totals, k)
+                    if np.linalg.norm(residual_new) <= np.linalg.norm(residual):
+                        break
+                alpha /= 2.0
+            else:
+                return y, False
+
+            y = np.maximum(y_new, 0.0)
+            residual = self.residual(y, totals, k)
+
+            if np.all(np.abs(alpha * step) <= self.rtol * np.abs(y) + self.atol) and \
+                    np.linalg.norm(residual, np.inf) <= self.ftol:
+                return y, self.is_stable(y, k)
+
+        return y, False
+
+    def integrate(self, y0, run_time, k=None):
+        self.num_integrated += 1
+        return self.network.integrate(y0[None], np.array([0.0, run_time]), k=k)[0, -1]
+
+    def solve_sweep(self, parameter, values, run_time, k=None):
+        '''Steady states for every value of an initial-condition parameter (e.g. Ls_0), in the order of values.
+
+        Values are visited in sorted order and each Newton solve starts from the previous steady state. A sample whose
+        Newton iteration does not converge to a stable state is integrated to run_time instead. For bistable networks
+        the continuation follows the branch of its predecessor, which can differ from the state reached from y0.'''
+        if k is None:
+            k = self.network.rate_constants()
+
+        y0 = self.network.initial_states(parameter, values)
+        steady_states = np.zeros_like(y0)
+
+        y_previous = None
+        for i in np.argsort(values, kind='mergesort'):
+            guess = y0[i] if y_previous is None else y_previous
+            y, converged = self.newton(guess, y0[i], k=k)
+
+            if converged:
+                self.num_newton += 1
+            else:
+                y = self.integrate(y0[i], run_time, k=k)
+
+            steady_states[i] = y
+            y_previous = y
+
+        return steady_states
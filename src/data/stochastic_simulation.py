@@ -0,0 +1,481 @@
+'''Native stochastic simulation of the SSC reaction networks. The forward_rxns/reverse_rxns lists and rate dictionaries
+built by TcrCycleSelfWithForeign (and the simpler KP ligand classes) are turned into integer stoichiometry arrays and a
+reaction dependency graph, which Gillespie's direct method uses to update only the propensities a reaction changes.'''
+
+import numpy as np
+
+
+def rate_key(reactants, products):
+    return ''.join(reactants) + '_' + ''.join(products)
+
+
+class ReactionNetwork(object):
+    def __init__(self, species, reactants, stoichiometry, rate_constants):
+        self.species = list(species)
+        self.num_species = len(self.species)
+
+        # reactants is (n_reactions x max_order), padded with n_species which indexes a count fixed at one
+        self.reactants = np.asarray(reactants, dtype=int)
+        self.stoichiometry = np.asarray(stoichiometry, dtype=np.int64)
+        self.rate_constants = np.asarray(rate_constants, dtype=float)
+        self.num_reactions = self.stoichiometry.shape[1]
+
+        # A reactant appearing m times contributes n (n - 1) ... (n - m + 1) / m! to the propensity
+        self.offsets = np.zeros_like(self.reactants)
+        multiplicity = np.ones(self.num_reactions)
+        for p in range(1, self.reactants.shape[1]):
+            repeats = np.sum(self.reactants[:, :p] == self.reactants[:, p:p + 1], axis=1)
+            repeats[self.reactants[:, p] == self.num_species] = 0
+            self.offsets[:, p] = repeats
+            multiplicity *= repeats + 1
+        self.propensity_constants = self.rate_constants / multiplicity
+
+        self.changed_species = [np.nonzero(self.stoichiometry[:, j])[0] for j in range(self.num_reactions)]
+        self.changes = [self.stoichiometry[species, j] for j, species in enumerate(self.changed_species)]
+        self.dependencies = self.dependency_graph()
+
+    def species_index(self, name):
+        return self.species.index(name)
+
+    def dependency_graph(self):
+        '''dependencies[j] holds every reaction whose propensity changes when reaction j fires.'''
+        consumers = [[] for i in range(self.num_species + 1)]
+        for k in range(self.num_reactions):
+            for species in set(self.reactants[k]):
+                consumers[species].append(k)
+
+        dependencies = []
+        for j in range(self.num_reactions):
+            reactions = set()
+            for species in self.changed_species[j]:
+                reactions.update(consumers[species])
+            dependencies.append(np.array(sorted(reactions), dtype=int))
+
+        return dependencies
+
+    def initial_counts(self, n_initial):
+        counts = np.zeros(self.num_species, dtype=np.int64)
+        for name, value in n_initial.items():
+            counts[self.species_index(name)] = value
+        return counts
+
+    def extend(self, counts):
+        '''State vector with the trailing count of one that padded reactant slots index.'''
+        return np.append(np.asarray(counts, dtype=np.int64), 1)
+
+    def propensities(self, state, reactions=None):
+        '''Propensities of reactions (all by default) for an extended state, or for a stack of them of shape
+        (n_trajectories, n_species + 1).'''
+        if reactions is None:
+            reactions = np.arange(self.num_reactions)
+        a = self.propensity_constants[reactions]
+        for p in range(self.reactants.shape[1]):
+            a = a * np.maximum(state[..., self.reactants[reactions, p]] - self.offsets[reactions, p], 0)
+        return a
+
+
+def from_reaction_lists(reaction_lists, rate_dictionaries, n_initial=None, record=None):
+    '''Network from lists of [reactants, products] pairs and their rate dictionaries, e.g.
+    ([ligand.forward_rxns, ligand.reverse_rxns], [ligand.forward_rates, ligand.reverse_rates]). Rates are looked up by
+    the key SSC scripts are written with (reactants_products) and otherwise by the reactants alone, as the simpler KP
+    ligand classes store them. Species are ordered as in n_initial, then record, then by first appearance.'''
+    species = []
+    for name in list(n_initial or []) + list(record or []):
+        if name not in species:
+            species.append(name)
+
+    reactions = []
+    for rxns, rates in zip(reaction_lists, rate_dictionaries):
+        for reactants, products in rxns:
+            key = rate_key(reactants, products)
+            rate = rates[key] if key in rates else rates[''.join(reactants)]
+            reactions.append((reactants, products, rate))
+            for name in reactants + products:
+                if name not in species:
+                    species.append(name)
+
+    num_species = len(species)
+    order = max(len(reactants) for reactants, products, rate in reactions)
+    reactant_array = np.full((len(reactions), order), num_species, dtype=int)
+    stoichiometry = np.zeros((num_species, len(reactions)), dtype=np.int64)
+
+    for j, (reactants, products, rate) in enumerate(reactions):
+        for p, name in enumerate(reactants):
+            reactant_array[j, p] = species.index(name)
+            stoichiometry[species.index(name), j] -= 1
+        for name in products:
+            stoichiometry[species.index(name), j] += 1
+
+    return ReactionNetwork(species, reactant_array, stoichiometry, [rate for reactants, products, rate in reactions])
+
+
+def from_ssc_model(ligand):
+    '''Network of a TcrCycleSelfWithForeign-style ligand object with its steps already added.'''
+    return from_reaction_lists([ligand.forward_rxns, ligand.reverse_rxns], [ligand.forward_rates, ligand.reverse_rates],
+                               n_initial=ligand.n_initial, record=ligand.record)
+
+
+def from_mass_action(network):
+    '''Stochastic counterpart of a MassActionNetwork, whose species amounts are molecule numbers. A homodimerization
+    has deterministic rate factor 1/2 k A^2, which corresponds to propensity k A (A - 1) / 2.'''
+    reactants = network.reactants
+    stoichiometry = np.round(network.stoichiometry).astype(np.int64)
+
+    rate_constants = network.rate_constants().copy()
+    for p in range(1, reactants.shape[1]):
+        repeats = np.sum(reactants[:, :p] == reactants[:, p:p + 1], axis=1)
+        repeats[reactants[:, p] == network.num_species] = 0
+        rate_constants *= repeats + 1
+
+    return ReactionNetwork(network.species, reactants, stoichiometry, rate_constants)
+
+
+class GillespieDirect(object):
+    def __init__(self, network, block_size=4096):
+        self.network = network
+        self.block_size = block_size
+
+    def random_numbers(self):
+        while True:
+            for u in np.random.random((self.block_size, 2)):
+                yield u[0], u[1]
+
+    def simulate(self, initial_counts, times, record=None):
+        '''One trajectory from initial_counts at time 0. Returns the counts of the record species (all species by
+        default) at each of the increasing times, shape (len(times), n_record).'''
+        network = self.network
+        if record is None:
+            record = np.arange(network.num_species)
+
+        state = network.extend(initial_counts)
+        a = network.propensities(state)
+        output = np.zeros((len(times), len(record)), dtype=np.int64)
+        random_numbers = self.random_numbers()
+
+        t = 0.0
+        i = 0
+        while i < len(times):
+            a0 = a.sum()
+            u_time, u_reaction = next(random_numbers)
+            tau = -np.log(1.0 - u_time) / a0 if a0 > 0 else np.inf
+
+            while i < len(times) and times[i] < t + tau:
+                output[i] = state[record]
+                i += 1
+            if i == len(times):
+                break
+
+            t += tau
+            j = min(np.searchsorted(np.cumsum(a), u_reaction * a0, side='right'), network.num_reactions - 1)
+            state[network.changed_species[j]] += network.changes[j]
+            dependencies = network.dependencies[j]
+            a[dependencies] = network.propensities(state, dependencies)
+
+        return output
+
+
+class IndexedPriorityQueue(object):
+    '''Binary min-heap of reaction times that also tracks where each reaction sits in the heap, so the time of any
+    reaction can be changed in O(log n).'''
+
+    def __init__(self, times):
+        # Plain lists: the queue is updated one element at a time, where list indexing beats NumPy scalars
+        self.times = [float(time) for time in times]
+        self.heap = [int(reaction) for reaction in np.argsort(times, kind='mergesort')]
+        self.position = [0] * len(self.times)
+        for i, reaction in enumerate(self.heap):
+            self.position[reaction] = i
+
+    def top(self):
+        return self.heap[0], self.times[self.heap[0]]
+
+    def swap(self, i, k):
+        self.heap[i], self.heap[k] = self.heap[k], self.heap[i]
+        self.position[self.heap[i]] = i
+        self.position[self.heap[k]] = k
+
+    def update(self, reaction, time):
+        old_time = self.times[reaction]
+        if time == old_time:
+            return
+        self.times[reaction] = time
+        i = self.position[reaction]
+
+        if time < old_time:
+            while i > 0:
+                parent = (i - 1) // 2
+                if self.times[self.heap[parent]] <= time:
+                    break
+                self.swap(i, parent)
+                i = parent
+        else:
+            size = len(self.heap)
+            while True:
+                child = 2 * i + 1
+                if child >= size:
+                    break
+                if child + 1 < size and self.times[self.heap[child + 1]] < self.times[self.heap[child]]:
+                    child += 1
+                if self.times[self.heap[child]] >= time:
+                    break
+                self.swap(i, child)
+                i = child
+
+
+class NextReactionMethod(object):
+    '''Gibson and Bruck's next reaction method. Every reaction keeps an absolute firing time in an indexed priority
+    queue; after a firing only the reactions in its dependency graph are rescaled, so an event costs O(log R).'''
+
+    def __init__(self, network, block_size=4096):
+        self.network = network
+        self.block_size = block_size
+
+    def random_numbers(self):
+        while True:
+            for u in np.random.random(self.block_size):
+                yield u
+
+    def simulate(self, initial_counts, times, record=None):
+        '''Same interface as GillespieDirect.simulate.'''
+        network = self.network
+        if record is None:
+            record = np.arange(network.num_species)
+
+        state = network.extend(initial_counts)
+        a = network.propensities(state)
+        output = np.zeros((len(times), len(record)), dtype=np.int64)
+        random_numbers = self.random_numbers()
+
+        with np.errstate(divide='ignore'):
+            firing_times = -np.log(1.0 - np.random.random(network.num_reactions)) / a
+        queue = IndexedPriorityQueue(firing_times)
+
+        i = 0
+        while i < len(times):
+            j, t = queue.top()
+
+            while i < len(times) and times[i] < t:
+                output[i] = state[record]
+                i += 1
+            if i == len(times):
+                break
+
+            state[network.changed_species[j]] += network.changes[j]
+
+            dependencies = network.dependencies[j]
+            a_new = network.propensities(state, dependencies)
+            for k, a_k in zip(dependencies, a_new):
+                if k == j:
+                    continue
+                if a_k <= 0:
+                    queue.update(k, np.inf)
+                elif a[k] > 0:
+                    queue.update(k, t + (a[k] / a_k) * (queue.times[k] - t))
+                else:
+                    queue.update(k, t - np.log(1.0 - next(random_numbers)) / a_k)
+            a[dependencies] = a_new
+
+            # The reaction that fired always draws a fresh time, whether or not it changed its own propensity
+            a_j = a[j]
+            queue.update(j, t - np.log(1.0 - next(random_numbers)) / a_j if a_j > 0 else np.inf)
+
+        return output
+
+
+class TauLeaping(object):
+    '''Adaptive explicit tau-leaping (Cao, Gillespie and Petzold). The leap is chosen so that the expected change and
+    standard deviation of every reactant stay below epsilon times its count. Reactions that could exhaust a reactant in
+    fewer than critical_threshold firings are critical: they fire at most once per leap, as in the exact SSA. When the
+    leap would be shorter than ssa_threshold / a0, ssa_steps exact direct-method events are taken instead.'''
+
+    def __init__(self, network, epsilon=0.03, critical_threshold=10, ssa_threshold=10.0, ssa_steps=100):
+        self.network = network
+        self.epsilon = epsilon
+        self.critical_threshold = critical_threshold
+        self.ssa_threshold = ssa_threshold
+        self.ssa_steps = ssa_steps
+
+        stoichiometry = network.stoichiometry
+        reactants = network.reactants
+        order = np.sum(reactants < network.num_species, axis=1)
+
+        # Highest order of reaction each species is a reactant of, and whether it is then a repeated reactant
+        self.highest_order = np.zeros(network.num_species, dtype=int)
+        self.repeated = np.zeros(network.num_species, dtype=bool)
+        for j in range(network.num_reactions):
+            for species in set(reactants[j]) - {network.num_species}:
+                repeated = np.sum(reactants[j] == species) > 1
+                if order[j] > self.highest_order[species]:
+                    self.highest_order[species] = order[j]
+                    self.repeated[species] = repeated
+                elif order[j] == self.highest_order[species]:
+                    self.repeated[species] |= repeated
+        self.is_reactant = np.zeros((network.num_reactions, network.num_species + 1), dtype=bool)
+        self.is_reactant[np.arange(network.num_reactions)[:, None], reactants] = True
+        self.is_reactant = self.is_reactant[:, :-1]
+
+        # Reactant consumption of each reaction, used for the number of firings L_j it can sustain
+        self.consumed = np.maximum(-stoichiometry, 0).T
+        self.consuming = self.consumed > 0
+
+        # Leaps plus exact events taken, and reactions fired, by all simulate calls so far
+        self.num_steps = 0
+        self.num_firings = 0
+
+    def max_firings(self, counts):
+        firings = np.where(self.consuming, counts[None, :] // np.maximum(self.consumed, 1), np.iinfo(np.int64).max)
+        return firings.min(axis=1)
+
+    def g(self, counts):
+        g = self.highest_order.astype(float)
+        dimer = self.repeated & (self.highest_order == 2) & (counts > 1)
+        g[dimer] = 2.0 + 1.0 / (counts[dimer] - 1)
+        return g
+
+    def leap_size(self, counts, a, noncritical):
+        '''Largest leap for which no reactant of a noncritical reaction is expected to change by more than
+        epsilon x_i / g_i.'''
+        stoichiometry = self.network.stoichiometry[:, noncritical]
+        mean = stoichiometry.dot(a[noncritical])
+        variance = (stoichiometry ** 2).dot(a[noncritical])
+
+        reactant_species = np.any(self.is_reactant[noncritical], axis=0)
+        bound = np.maximum(self.epsilon * counts[reactant_species] / self.g(counts)[reactant_species], 1.0)
+        mean = np.abs(mean[reactant_species])
+        variance = variance[reactant_species]
+
+        with np.errstate(divide='ignore'):
+            tau = np.minimum(bound / mean, bound ** 2 / variance)
+        return tau.min() if len(tau) else np.inf
+
+    def direct_steps(self, state, t, t_end):
+        '''Up to ssa_steps exact events, stopping at t_end. Returns the new time.'''
+        network = self.network
+        a = network.propensities(state)
+        for step in range(self.ssa_steps):
+            a0 = a.sum()
+            if a0 <= 0:
+                return t_end
+            u_time, u_reaction = np.random.random(2)
+            tau = -np.log(1.0 - u_time) / a0
+            if t + tau >= t_end:
+                return t_end
+
+            t += tau
+            j = min(np.searchsorted(np.cumsum(a), u_reaction * a0, side='right'), network.num_reactions - 1)
+            state[network.changed_species[j]] += network.changes[j]
+            dependencies = network.dependencies[j]
+            a[dependencies] = network.propensities(state, dependencies)
+            self.num_steps += 1
+            self.num_firings += 1
+
+        return t
+
+    def leap(self, state, t, t_end):
+        '''One leap (or a run of exact events) no further than t_end. Returns the new time.'''
+        network = self.network
+        counts = state[:-1]
+        a = network.propensities(state)
+        a0 = a.sum()
+        if a0 <= 0:
+            return t_end
+
+        critical = (a > 0) & (self.max_firings(counts) < self.critical_threshold)
+        noncritical = ~critical
+        tau_noncritical = self.leap_size(counts, a, noncritical)
+
+        a0_critical = a[critical].sum()
+        while True:
+            if tau_noncritical < self.ssa_threshold / a0:
+                return self.direct_steps(state, t, t_end)
+
+            tau_critical = -np.log(1.0 - np.random.random()) / a0_critical if a0_critical > 0 else np.inf
+            tau = min(tau_noncritical, tau_critical, t_end - t)
+
+            firings = np.zeros(network.num_reactions, dtype=np.int64)
+            firings[noncritical] = np.random.poisson(a[noncritical] * tau)
+            if tau == tau_critical:
+                j = np.searchsorted(np.cumsum(np.where(critical, a, 0.0)), np.random.random() * a0_critical,
+                                    side='right')
+                firings[min(j, network.num_reactions - 1)] += 1
+
+            new_counts = counts + network.stoichiometry.dot(firings)
+            if np.all(new_counts >= 0):
+                state[:-1] = new_counts
+                self.num_steps += 1
+                self.num_firings += firings.sum()
+                return t_end if tau == t_end - t else t + tau
+
+            tau_noncritical /= 2.0
+
+    def simulate(self, initial_counts, times, record=None):
+        '''Same interface as GillespieDirect.simulate.'''
+        if record is None:
+            record = np.arange(self.network.num_species)
+
+        state = self.network.extend(initial_counts)
+        output = np.zeros((len(times), len(record)), dtype=np.int64)
+
+        t = 0.0
+        for i, t_record in enumerate(times):
+            while t < t_record:
+                t = self.leap(state, t, t_record)
+            output[i] = state[record]
+
+        return output
+
+
+class EnsembleDirect(object):
+    '''Direct method for an ensemble of trajectories advanced in lockstep: every iteration computes the propensity
+    matrix of all unfinished trajectories, draws their waiting times and reactions together and fires one event in
+    each, so the work per event is spread over NumPy arrays instead of one interpreter loop per trajectory.'''
+
+    def __init__(self, network):
+        self.network = network
+
+    def simulate(self, initial_counts, times, num_trajectories, record=None):
+        '''Mean and variance over num_trajectories of the counts of the record species (all species by default) at
+        each of the increasing times, both of shape (len(times), n_record).'''
+        network = self.network
+        if record is None:
+            record = np.arange(network.num_species)
+
+        state = np.tile(network.extend(initial_counts), (num_trajectories, 1))
+        output = np.zeros((num_trajectories, len(times), len(record)), dtype=np.int64)
+        changes = network.stoichiometry.T
+
+        t = np.zeros(num_trajectories)
+        next_record = np.zeros(num_trajectories, dtype=int)
+        active = np.arange(num_trajectories)
+
+        while len(active):
+            a = network.propensities(state[active])
+            a0 = a.sum(axis=1)
+            u = np.random.random((len(active), 2))
+            with np.errstate(divide='ignore'):
+                t_next = t[active] - np.log(1.0 - u[:, 0]) / a0
+
+            # Record every time point a trajectory passes before its next event
+            while True:
+                pending = next_record[active] < len(times)
+                crossing = pending & (times[np.minimum(next_record[active], len(times) - 1)] < t_next)
+                if not crossing.any():
+                    break
+                rows = active[crossing]
+                output[rows, next_record[rows]] = state[rows][:, record]
+                next_record[rows] += 1
+
+            firing = next_record[active] < len(times)
+            cumulative = np.cumsum(a[firing], axis=1)
+            j = np.sum(cumulative <= (u[firing, 1] * a0[firing])[:, None], axis=1)
+
+            active = active[firing]
+            state[active, :-1] += changes[np.minimum(j, network.num_reactions - 1)]
+            t[active] = t_next[firing]
+
+        return output.mean(axis=0), output.var(axis=0, ddof=1 if num_trajectories > 1 else 0)
+
+
+# Stochastic simulators selectable with --ssa_method; ensemble runs all trajectories of a sample together
+methods = {'direct': GillespieDirect, 'next_reaction': NextReactionMethod, 'tau_leap': TauLeaping,
+           'ensemble': EnsembleDirect}
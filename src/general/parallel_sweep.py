@@ -0,0 +1,39 @@
+from functools import partial
+from multiprocessing import Pool
+
+# Model built once in each worker process by initialize_worker
+worker_model = None
+worker_observables = None
+
+
+def initialize_worker(model_class, init_kwargs, attributes):
+    global worker_model, worker_observables
+    worker_model = model_class(**init_kwargs)
+    for name, value in attributes.items():
+        setattr(worker_model, name, value)
+    worker_observables = worker_model.make_model()
+
+
+def solve_sample(args, sample):
+    return worker_model.solve_ligand(sample, worker_observables, *args)
+
+
+def iterate_parallel_sweep(model_class, init_kwargs, samples, workers, *args, **kwargs):
+    '''Generator form of parallel_sweep: yields the result of every sample, in the order of samples, as soon as it and
+    all samples before it are done.'''
+    attributes = kwargs.get('attributes', {})
+    chunksize = max(1, len(samples) // (4 * workers))
+    pool = Pool(workers, initializer=initialize_worker, initargs=(model_class, init_kwargs, attributes))
+    try:
+        for result in pool.imap(partial(solve_sample, args), samples, chunksize=chunksize):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parallel_sweep(model_class, init_kwargs, samples, workers, *args, **kwargs):
+    '''Calls model.solve_ligand(sample, observables, *args) for every sample on a pool of workers, each of which builds
+    model_class(**init_kwargs) once, after setting the attributes given by the attributes keyword (e.g. the ODE
+    backend). Results are returned in the order of samples.'''
+    return list(iterate_parallel_sweep(model_class, init_kwargs, samples, workers, *args, **kwargs))
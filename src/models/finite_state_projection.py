@@ -0,0 +1,141 @@
+'''Finite state projection (FSP) of the chemical master equation of a small ReactionNetwork. The master equation is
+restricted to a finite set of copy-number states; probability that would leave the set flows into absorbing sinks, one
+per boundary state, so the total sink probability bounds the error of the projected distribution and the states it
+escaped from show where the set has to grow. The generator is built once for the union of the ligand initial states and
+all ligand values are propagated together, only the initial distribution differing between them.
+
+The reachable states grow combinatorially with the copy numbers, so this is for networks of a few molecules per
+species; the toy model's receptor and substrate numbers (10^4) are far beyond any max_states.'''
+
+import numpy as np
+import scipy.sparse
+from scipy.sparse.linalg import expm_multiply
+
+
+class FiniteStateProjection(object):
+    def __init__(self, network, tolerance=1e-4, max_states=200000, layers=10):
+        self.network = network
+        self.tolerance = tolerance
+        self.max_states = max_states
+        self.layers = layers
+
+        self.states = np.zeros((0, network.num_species), dtype=np.int64)
+        self.index = {}
+        self.error = None
+
+    def add_states(self, states):
+        '''Adds the states not yet in the projection; returns the newly added ones.'''
+        new_states = []
+        for state in np.unique(np.atleast_2d(states), axis=0):
+            if state.tobytes() not in self.index:
+                self.index[state.tobytes()] = len(self.states) + len(new_states)
+                new_states.append(state)
+
+        if new_states:
+            self.states = np.concatenate([self.states, new_states])
+            if len(self.states) > self.max_states:
+                raise RuntimeError("Finite state projection exceeded {0} states".format(self.max_states))
+
+        return np.array(new_states, dtype=np.int64).reshape(-1, self.network.num_species)
+
+    def successors(self, states):
+        '''Propensities of every reaction in every state and the states they lead to.'''
+        extended = np.concatenate([states, np.ones((len(states), 1), dtype=np.int64)], axis=1)
+        a = self.network.propensities(extended)
+        return a, states[:, None, :] + self.network.stoichiometry.T[None, :, :]
+
+    def expand(self, states, layers=1):
+        '''Adds every state reachable from states in at most layers reactions.'''
+        for layer in range(layers):
+            a, targets = self.successors(states)
+            states = self.add_states(targets[a > 0])
+            if len(states) == 0:
+                break
+
+    def generator(self):
+        '''Sparse generator of the projected master equation with one sink row per boundary state, and the boundary
+        state of each sink.'''
+        a, targets = self.successors(self.states)
+        source, reaction = np.nonzero(a)
+        rates = a[source, reaction]
+        target = np.array([self.index.get(state.tobytes(), -1) for state in targets[source, reaction]], dtype=int)
+
+        inside = target >= 0
+        boundary, sink = np.unique(source[~inside], return_inverse=True)
+        num_states = len(self.states)
+        size = num_states + len(boundary)
+
+        rows = np.concatenate([target[inside], num_states + sink, np.arange(num_states)])
+        columns = np.concatenate([source[inside], source[~inside], np.arange(num_states)])
+        values = np.concatenate([rates[inside], rates[~inside], -a.sum(axis=1)])
+
+        return scipy.sparse.csc_matrix((values, (rows, columns)), shape=(size, size)), boundary
+
+    def propagate(self, initial_states, time):
+        '''Probabilities at time starting from a point mass at every initial state, computed with the action of the
+        matrix exponential of the shared generator on all of them at once. Returns (n_initial x n_states + n_sinks) and
+        the boundary state of each sink.'''
+        matrix, boundary = self.generator()
+
+        p0 = np.zeros((matrix.shape[0], len(initial_states)))
+        p0[[self.index[state.tobytes()] for state in initial_states], np.arange(len(initial_states))] = 1.0
+
+        return expm_multiply(matrix * time, p0).T, boundary
+
+    def solve(self, initial_states, time, max_expansions=100):
+        '''Distribution over the projected states at time for each initial state. The projection is grown from the
+        boundary states through which more than tolerance / n_boundary probability escaped until the escaped probability
+        of every initial state is below tolerance. Returns (n_initial x n_states); self.error holds the escaped
+        probability, an upper bound on the L1 error of each row.'''
+        initial_states = np.atleast_2d(np.asarray(initial_states, dtype=np.int64))
+        self.expand(self.add_states(initial_states), layers=self.layers)
+
+        for expansion in range(max_expansions):
+            p, boundary = self.propagate(initial_states, time)
+            num_states = len(self.states)
+            escaped = np.maximum(p[:, num_states:], 0.0)
+            self.error = escaped.sum(axis=1)
+
+            if self.error.max() <= self.tolerance:
+                return np.maximum(p[:, :num_states], 0.0)
+
+            significant = escaped.max(axis=0) > self.tolerance / len(boundary)
+            self.expand(self.states[boundary[significant]], layers=self.layers)
+
+        raise RuntimeError("Finite state projection did not reach tolerance {0} in {1} expansions".format(
+            self.tolerance, max_expansions))
+
+    def output_distribution(self, initial_states, time, weights):
+        '''P(output | initial state) of the output weights.dot(state). Returns the output values and the probabilities,
+        one row per initial state.'''
+        p = self.solve(initial_states, time)
+        output = self.states.dot(weights)
+        values, columns = np.unique(np.round(output).astype(np.int64), return_inverse=True)
+
+        distribution = np.zeros((len(p), len(values)))
+        for i in range(len(p)):
+            distribution[i] = np.bincount(columns, weights=p[i], minlength=len(values))
+
+        return values, distribution
+
+
+def mixture(distribution, ligand_weights):
+    '''Output distribution averaged over the ligand distribution, e.g. the lognormal Ls weights of the sampled
+    sweeps.'''
+    ligand_weights = np.asarray(ligand_weights, dtype=float)
+    return ligand_weights.dot(distribution) / ligand_weights.sum()
+
+
+def capacity(self_values, self_distribution, foreign_values, foreign_distribution):
+    '''Capacity (bits) of the self vs self + foreign channel with equal priors from the two output distributions; the
+    discrete counterpart of InformationCapacity.calculate_ic.'''
+    values = np.union1d(self_values, foreign_values)
+    p_self = np.zeros(len(values))
+    p_self[np.searchsorted(values, self_values)] = self_distribution
+    p_foreign = np.zeros(len(values))
+    p_foreign[np.searchsorted(values, foreign_values)] = foreign_distribution
+
+    p_o = 0.5 * (p_self + p_foreign)
+    term_self = 0.5 * p_self * np.nan_to_num(np.log2(p_self / p_o))
+    term_foreign = 0.5 * p_foreign * np.nan_to_num(np.log2(p_foreign / p_o))
+    return np.sum(term_self + term_foreign)
@@ -2,9 +2,10 @@ import argparse
 
 import numpy as np
 from pysb import *
-from pysb.integrate import odesolve
 
+from src.data.compiled_backend import BACKENDS, solve_ode
 from src.data.pysb_t_cell_network import write_model_attributes
+from src.general.parallel_sweep import parallel_sweep
 
 parameters = {'kp': 0.1, 'koff': 0.05, 'koffs': 0.05, 'kon': 0.0022, 'kons': 0.1, 'kf': 0.2,
               'R': 30000.0, 'lfT': 10.0, 'M': 15, 'St': 10000.0}
@@ -39,6 +40,7 @@ class ToyModel(object):
 
         self.run_time = 10000
         self.tspan = np.linspace(0, self.run_time)
+        self.backend = "python"
 
         self.p_ligand = [int(i) for i in np.round(np.random.lognormal(self.mu, self.sigma, self.num_samples))]
 
@@ -186,13 +188,16 @@ class ToyModel(object):
         # if "O_{0}".format(product) not in observables:
         #     observables.append("O_{0}".format(product))
 
-    def main(self):
-        output_array = []
-        ligand_array = []
-        ls_ss_array = []
-        r_ss_array = []
-        lf_ss_array = []
+    def solve_ligand(self, ligand, observables=None):
+        self.model.parameters['Ls_0'].value = ligand
 
+        y = solve_ode(self.model, self.tspan, backend=self.backend)
+
+        lf_ss = y['O_Lf'][-1] if self.self_foreign else None
+
+        return y['O_SP'][-1], y['O_Ls'][-1], y['O_R'][-1], lf_ss
+
+    def main(self, workers=1):
         self.make_model()
 
         write_model_attributes(self.model.rules, "rules")
@@ -201,25 +206,19 @@ class ToyModel(object):
 
         np.savetxt("time", self.tspan, fmt='%f')
 
-        for ligand in self.p_ligand:
-            self.model.parameters['Ls_0'].value = ligand
-            ligand_array.append(ligand)
-
-            y = odesolve(self.model, self.tspan, compiler="python")
-
-            output = y['O_SP']
-            ls_ss = y['O_Ls']
-            r_ss = y['O_R']
-
-            if self.self_foreign:
-                lf_ss = y['O_Lf']
-                lf_ss_array.append(lf_ss[-1])
+        if workers > 1:
+            init_kwargs = {'ks_multiplier': self.ks_multiplier, 'self_foreign': self.self_foreign}
+            results = parallel_sweep(self.__class__, init_kwargs, self.p_ligand, workers,
+                                     attributes={'backend': self.backend})
+        else:
+            results = [self.solve_ligand(ligand) for ligand in self.p_ligand]
 
-            output_array.append(output[-1])
-            ls_ss_array.append(ls_ss[-1])
-            r_ss_array.append(r_ss[-1])
+        output_array = [r[0] for r in results]
+        ls_ss_array = [r[1] for r in results]
+        r_ss_array = [r[2] for r in results]
+        lf_ss_array = [r[3] for r in results if r[3] is not None]
 
-        np.savetxt("Ligand_concentrations", ligand_array, fmt='%f')
+        np.savetxt("Ligand_concentrations", self.p_ligand, fmt='%f')
         np.savetxt("output", output_array, fmt='%f')
         np.savetxt("ls_ss", ls_ss_array, fmt='%f')
         np.savetxt("lf_ss", lf_ss_array, fmt='%f')
@@ -232,12 +231,21 @@ if __name__ == "__main__":
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--lf', dest='lf', action='store_true', default=False,
                         help="Flag to submit self w/ foreign sims.")
+    parser.add_argument('--workers', dest='workers', action='store', type=int, default=1,
+                        help='Number of processes the ligand sweep is spread over.')
+    parser.add_argument('--seed', dest='seed', action='store', type=int, help='Seed for the ligand samples.')
+    parser.add_argument('--backend', dest='backend', action='store', choices=BACKENDS, default="python",
+                        help='ODE backend; compiled caches a native right-hand side and Jacobian per model structure.')
     args = parser.parse_args()
 
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
     if args.lf:
         tcr = ToyModel(self_foreign=True)
 
     else:
         tcr = ToyModel()
 
-    tcr.main()
+    tcr.backend = args.backend
+    tcr.main(workers=args.workers)
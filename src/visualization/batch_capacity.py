@@ -0,0 +1,124 @@
+'''Capacities of every run directory of a parameter search (as listed in its file_paths, or else every subdirectory
+holding Ls and Ls_Lf_<lf>), computed on a pool of worker processes. Results are cached in capacity_cache.pickle in the
+search directory, keyed by the modification time and size of each run's output and Ligand_concentrations files, the
+estimator settings and lf, so only new or re-simulated runs are computed again. All runs are then written to
+capacity_table, one row per run with its parameters, C and the bootstrap interval of C.'''
+
+import argparse
+import os
+import pickle
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from src.visualization.compute_ic import InformationCapacity
+
+cache_file = "capacity_cache.pickle"
+table_file = "capacity_table"
+
+
+def run_directories(directory, lf):
+    if os.path.exists(os.path.join(directory, "file_paths")):
+        return list(pd.read_csv(os.path.join(directory, "file_paths"), sep='\t', index_col=0)['file_path'])
+
+    return sorted(path for path in os.listdir(directory)
+                  if os.path.isdir(os.path.join(directory, path, "Ls")) and
+                  os.path.isdir(os.path.join(directory, path, "Ls_Lf_{0}".format(lf))))
+
+
+def input_key(file_path, lf, estimator, num_resamples):
+    '''Modification time and size of the files the capacity of a run is computed from, and its settings.'''
+    key = [lf, estimator, num_resamples]
+    for condition in ["Ls", "Ls_Lf_{0}".format(lf)]:
+        for name in ["output", "Ligand_concentrations"]:
+            path = os.path.join(file_path, condition, name)
+            key.append((os.path.getmtime(path), os.path.getsize(path)) if os.path.exists(path) else None)
+    return tuple(key)
+
+
+def compute_capacity(args):
+    file_path, lf, estimator, num_resamples = args
+    ic = InformationCapacity(foreign_directory=os.path.join(file_path, "Ls_Lf_{0}/".format(lf)),
+                             self_directory=os.path.join(file_path, "Ls/"), estimator=estimator, limiting="self",
+                             num_resamples=num_resamples)
+    np.savetxt(os.path.join(file_path, "IC"), [ic.capacity], fmt="%f")
+
+    return ic.capacity, ic.capacity_ci
+
+
+def load_cache(directory):
+    path = os.path.join(directory, cache_file)
+    if not os.path.exists(path):
+        return {}
+    return pickle.load(open(path, "rb"))
+
+
+def store_cache(directory, cache):
+    pickle_out = tempfile.NamedTemporaryFile(suffix=".pickle", dir=directory, delete=False)
+    pickle.dump(cache, pickle_out)
+    pickle_out.close()
+    os.rename(pickle_out.name, os.path.join(directory, cache_file))
+
+
+def run_parameters(file_path):
+    path = os.path.join(file_path, "Ls", "parameters.pickle")
+    if not os.path.exists(path):
+        return {}
+    return pickle.load(open(path, "rb"))
+
+
+def batch_capacity(directory=".", lf=30, estimator='fd', num_resamples=0, workers=None):
+    '''Capacity table of the runs of directory, computing only the runs whose cache entry is missing or stale.'''
+    file_paths = run_directories(directory, lf)
+    keys = dict((path, input_key(os.path.join(directory, path), lf, estimator, num_resamples)) for path in file_paths)
+
+    cache = load_cache(directory)
+    stale = [path for path in file_paths if path not in cache or cache[path]['key'] != keys[path]]
+    print("{0} of {1} capacities to compute".format(len(stale), len(file_paths)))
+
+    if stale:
+        pool = Pool(workers)
+        try:
+            results = pool.map(compute_capacity, [(os.path.join(directory, path), lf, estimator, num_resamples)
+                                                  for path in stale], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        for path, (C, capacity_ci) in zip(stale, results):
+            cache[path] = {'key': keys[path], 'C': C, 'ci': capacity_ci}
+        store_cache(directory, cache)
+
+    rows = []
+    for path in file_paths:
+        row = {'file_path': path}
+        row.update(run_parameters(os.path.join(directory, path)))
+        capacity_ci = cache[path]['ci'] or (np.nan, np.nan)
+        row.update({'C': cache[path]['C'], 'C_low': capacity_ci[0], 'C_high': capacity_ci[1]})
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    table.to_csv(os.path.join(directory, table_file), sep='\t', float_format='%f')
+
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capacities of all runs of a parameter search",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--directory', dest='directory', action='store', default=".",
+                        help="Parameter search directory.")
+    parser.add_argument('--lf', dest='lf', action='store', type=int, default=30,
+                        help="Number of foreign ligands of the Ls_Lf directories.")
+    parser.add_argument('--estimator', dest='estimator', action='store', default='fd', choices=['fd', 'kde', 'knn'],
+                        help="Capacity estimator.")
+    parser.add_argument('--num_resamples', dest='num_resamples', action='store', type=int, default=0,
+                        help="Bootstrap resamples for the interval of C, e.g. 200 (0 for none).")
+    parser.add_argument('--workers', dest='workers', action='store', type=int,
+                        help="Worker processes (default: one per CPU).")
+    args = parser.parse_args()
+
+    batch_capacity(args.directory, lf=args.lf, estimator=args.estimator, num_resamples=args.num_resamples,
+                   workers=args.workers)
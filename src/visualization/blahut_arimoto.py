@@ -0,0 +1,144 @@
+'''Channel capacity over the input distribution by the Blahut-Arimoto algorithm. calculate_ic fixes equal priors on the
+self and self + foreign conditions; here every row of a channel matrix P(O | input) is an input (e.g. one ligand level
+of one foreign count) and the prior over the rows is optimised. Each iteration is two matrix-vector products, and
+iterating stops when the lower and upper capacity bounds log sum p exp(D) and max D, with D the relative entropy of each
+row to the current output distribution, agree within tolerance.
+
+Channel rows can be built from the outputs the sweeps already write: output with output_variance (--lna, Gaussian
+rows) or a plain output file whose samples form one input, or from output_values with output_distribution, one discrete
+distribution per ligand (e.g. FiniteStateProjection.output_distribution of a small network).'''
+
+import argparse
+import os
+
+import numpy as np
+from scipy.stats import norm
+
+
+def blahut_arimoto(channel, tolerance=1e-4, max_iterations=100000):
+    '''Capacity (bits) of the channel, (n_inputs x n_outputs) with rows summing to one, and the input distribution
+    attaining it, to within tolerance bits. Updates are over-relaxed, p <- p exp(mu D) with mu doubled while the mutual
+    information keeps increasing and reset to the plain (mu = 1, always increasing) update otherwise, which takes
+    several times fewer iterations on smooth channels.'''
+    channel = np.asarray(channel, dtype=float)
+    # Output bins no input reaches do not enter any product
+    channel = channel[:, channel.max(axis=0) > 0]
+    channel = channel / channel.sum(axis=1)[:, None]
+    with np.errstate(divide='ignore'):
+        log_channel = np.where(channel > 0, np.log(channel), 0.0)
+    negative_entropy = np.sum(channel * log_channel, axis=1)
+
+    def divergence(p):
+        '''Relative entropy of every row to the output distribution of p.'''
+        q = p.dot(channel)
+        with np.errstate(divide='ignore'):
+            log_q = np.where(q > 0, np.log(q), 0.0)
+        return negative_entropy - channel.dot(log_q)
+
+    p = np.ones(len(channel)) / len(channel)
+    D = divergence(p)
+    information = p.dot(D)
+    mu = 1.0
+    for iteration in range(max_iterations):
+        upper = D.max()
+        lower = upper + np.log(np.sum(p * np.exp(D - upper)))
+        if upper - lower < tolerance * np.log(2):
+            break
+
+        weights = p * np.exp(mu * (D - upper))
+        p_next = weights / weights.sum()
+        D_next = divergence(p_next)
+        information_next = p_next.dot(D_next)
+
+        if information_next >= information or mu == 1.0:
+            p, D, information = p_next, D_next, information_next
+            mu *= 2.0
+        else:
+            mu = 1.0
+
+    return lower / np.log(2), p
+
+
+def sample_channel(samples, bins):
+    '''One row per list of output samples: the fraction of them in each bin.'''
+    channel = np.array([np.histogram(np.ravel(output), bins=bins)[0] for output in samples], dtype=float)
+    return channel / channel.sum(axis=1)[:, None]
+
+
+def gaussian_channel(means, variances, bins):
+    '''One row per Gaussian output, e.g. the linear noise approximation: its probability in each bin.'''
+    sd = np.sqrt(np.maximum(variances, 0.0))[:, None]
+    cdf = norm.cdf(bins[None, :], loc=np.asarray(means)[:, None], scale=np.where(sd > 0, sd, 1e-12))
+    channel = np.diff(cdf, axis=1)
+    return channel / channel.sum(axis=1)[:, None]
+
+
+def discrete_channel(values, distribution, bins):
+    '''One row per discrete output distribution on values, e.g. the finite state projection: its mass in each bin.'''
+    distribution = np.atleast_2d(distribution)
+    channel = np.array([np.histogram(values, bins=bins, weights=row)[0] for row in distribution])
+    return channel / channel.sum(axis=1)[:, None]
+
+
+def output_range(directory):
+    if os.path.exists(directory + "output_distribution"):
+        values = np.loadtxt(directory + "output_values")
+        return values.min(), values.max()
+    output = np.loadtxt(directory + "output")
+    if os.path.exists(directory + "output_variance"):
+        sd = np.sqrt(np.maximum(np.loadtxt(directory + "output_variance"), 0.0))
+        return np.min(output - 4 * sd), np.max(output + 4 * sd)
+    return output.min(), output.max()
+
+
+def directory_channel(directory, bins):
+    '''Channel rows of one sweep directory and a label for each.'''
+    if os.path.exists(directory + "output_distribution"):
+        channel = discrete_channel(np.loadtxt(directory + "output_values"),
+                                   np.loadtxt(directory + "output_distribution"), bins)
+        ligand = np.atleast_1d(np.loadtxt(directory + "Ligand_concentrations"))
+        return channel, ["{0} {1}".format(directory, value) for value in ligand]
+    if os.path.exists(directory + "output_variance"):
+        channel = gaussian_channel(np.atleast_1d(np.loadtxt(directory + "output")),
+                                   np.atleast_1d(np.loadtxt(directory + "output_variance")), bins)
+        ligand = np.atleast_1d(np.loadtxt(directory + "Ligand_concentrations"))
+        return channel, ["{0} {1}".format(directory, value) for value in ligand]
+    return sample_channel([np.loadtxt(directory + "output")], bins), [directory]
+
+
+def channel_from_directories(directories, num_bins=1000):
+    '''Channel matrix of all rows of the given directories on num_bins shared bins.'''
+    ranges = np.array([output_range(directory) for directory in directories])
+    bins = np.linspace(ranges[:, 0].min(), ranges[:, 1].max(), num=num_bins + 1)
+
+    channels = []
+    labels = []
+    for directory in directories:
+        channel, directory_labels = directory_channel(directory, bins)
+        channels.append(channel)
+        labels += directory_labels
+
+    return np.concatenate(channels), labels, bins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Channel capacity over the inputs of sweep directories",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('directories', nargs='+',
+                        help="Directories with output_distribution, output and output_variance, or output.")
+    parser.add_argument('--num_bins', dest='num_bins', action='store', type=int, default=1000,
+                        help="Number of output bins.")
+    parser.add_argument('--tolerance', dest='tolerance', action='store', type=float, default=1e-4,
+                        help="Gap between the capacity bounds (bits) at which to stop.")
+    args = parser.parse_args()
+
+    directories = [os.path.join(directory, "") for directory in args.directories]
+    channel, labels, bins = channel_from_directories(directories, num_bins=args.num_bins)
+    C, p = blahut_arimoto(channel, tolerance=args.tolerance)
+    print("C = " + str(C))
+
+    np.savetxt("capacity", [C], fmt='%f')
+    f = open("input_distribution", "w")
+    for label, probability in zip(labels, p):
+        f.write("{0} {1:e}\n".format(label, probability))
+    f.close()
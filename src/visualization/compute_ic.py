@@ -4,20 +4,153 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 from src.general.directory_handling import load
+from src.visualization.capacity_estimators import knn_capacity
+
+# np.trapz was renamed np.trapezoid in numpy 2.0
+trapz = np.trapezoid if hasattr(np, 'trapezoid') else np.trapz
+
+# Candidate bin counts evaluated together when searching for the histogram refinement
+bin_count_block = 256
+
+# Bootstrap resamples behind capacity_ci, which is only computed when num_resamples is passed. Histogram resamples cost
+# a few ms per capacity; kde resamples are smoothed by one FFT each, about 0.1-0.4 s per capacity
+bootstrap_resamples = 200
+
+# Grid points of the estimator='kde' densities, and the kernel half-width in bandwidths
+kde_grid_size = 2048
+kde_cutoff = 4.0
+
+
+def data_range(sorted_output):
+    '''Range np.histogram bins data over: its extremes, widened by 0.5 either side when they coincide.'''
+    low, high = sorted_output[0], sorted_output[-1]
+    if low == high:
+        return low - 0.5, high + 0.5
+    return low, high
+
+
+def sorted_histogram(sorted_output, bin_locations):
+    '''np.histogram(output, bins=bin_locations, density=True)[0] from the sorted output, by counting the values below
+    each edge; the last bin is closed as in np.histogram.'''
+    below = np.searchsorted(sorted_output, bin_locations, side='left')
+    below[-1] = np.searchsorted(sorted_output, bin_locations[-1], side='right')
+    counts = np.diff(below)
+    # In np.histogram's order of operations, so the densities agree to the last bit
+    return counts / np.diff(bin_locations) / counts.sum()
+
+
+def end_bin_fractions(sorted_output, low, high, bin_counts):
+    '''Fraction of the in-range output in the first and in the last bin of np.linspace(low, high, num=n), for every n
+    in bin_counts.'''
+    step = (high - low) / (bin_counts - 1.0)
+    start = np.searchsorted(sorted_output, low, side='left')
+    end = np.searchsorted(sorted_output, high, side='right')
+    first = np.searchsorted(sorted_output, low + step, side='left') - start
+    last = end - np.searchsorted(sorted_output, (bin_counts - 2) * step + low, side='left')
+    return first / float(end - start), last / float(end - start)
+
+
+def bin_edges(indices, step, low, high, last_edge):
+    '''Edges at the given indices as np.linspace(low, high, ...) computes them: index * step + low, the last high.'''
+    return np.where(indices == last_edge, high, indices * step + low)
+
+
+def bin_indices(sorted_output, low, high, bin_counts):
+    '''Bin of every in-range value for each of the bin counts (one row per count), as np.histogram assigns it on the
+    edges np.linspace(low, high, num=n); the last bin is closed. The quotient (value - low) / step can land one bin off
+    at an edge, which integer outputs often sit on, so it is corrected against the edges themselves.'''
+    values = sorted_output[(sorted_output >= low) & (sorted_output <= high)][None, :]
+    step = ((high - low) / (bin_counts - 1.0))[:, None]
+    last_edge = (bin_counts - 1)[:, None]
+
+    indices = np.minimum(((values - low) / step).astype(np.int64), last_edge - 1)
+    indices -= values < bin_edges(indices, step, low, high, last_edge)
+    indices += (values >= bin_edges(indices + 1, step, low, high, last_edge)) & (indices < last_edge - 1)
+    return indices
+
+
+def separated(sorted_foreign, sorted_self, low, high, bin_counts):
+    '''Whether no bin holds both outputs, for each bin count. The capacity integral then equals the p(O) integral.'''
+    foreign_bins = bin_indices(sorted_foreign, low, high, bin_counts)
+    self_bins = bin_indices(sorted_self, low, high, bin_counts)
+    return np.array([len(np.intersect1d(f, d)) == 0 for f, d in zip(foreign_bins, self_bins)])
+
+
+def silverman_bandwidth(sorted_output):
+    '''Silverman's rule of thumb 0.9 min(sd, IQR / 1.34) n^(-1/5), falling back to whichever spread is nonzero and to a
+    spread of one molecule for constant output.'''
+    spread = np.std(sorted_output)
+    iqr = np.subtract(*np.percentile(sorted_output, [75, 25])) / 1.34
+    if iqr > 0:
+        spread = min(spread, iqr)
+    if spread == 0:
+        spread = 1.0
+    return 0.9 * spread * len(sorted_output) ** (-0.2)
+
+
+def linear_binning(output, low, step, grid_size):
+    '''Weights of the output on the grid low + step * i, every value split between its two nearest points.'''
+    position = (output - low) / step
+    left = np.clip(np.floor(position).astype(np.int64), 0, grid_size - 2)
+    right_weight = position - left
+    return np.bincount(left, weights=1.0 - right_weight, minlength=grid_size) + \
+        np.bincount(left + 1, weights=right_weight, minlength=grid_size)
+
+
+def kernel_smooth(counts, step, bandwidth):
+    '''Grid counts (last axis) convolved with the Gaussian kernel sampled on the grid spacing step, by FFT.'''
+    grid_size = counts.shape[-1]
+    half_width = min(int(np.ceil(kde_cutoff * bandwidth / step)), grid_size - 1)
+    offsets = step * np.arange(-half_width, half_width + 1)
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (np.sqrt(2 * np.pi) * bandwidth)
+
+    size = 2 ** int(np.ceil(np.log2(grid_size + 2 * half_width)))
+    density = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    return np.maximum(density[..., half_width:half_width + grid_size], 0.0)
+
+
+def binned_kde(output, low, step, grid_size, bandwidth):
+    '''Gaussian kernel density of the output on the grid low + step * i: the linearly binned counts convolved with the
+    sampled kernel by FFT, O(n + G log G).'''
+    return kernel_smooth(linear_binning(output, low, step, grid_size), step, bandwidth) / len(output)
+
+
+def resampled_histograms(sorted_output, bin_locations, num_resamples, random_state):
+    '''sorted_histogram of num_resamples bootstrap resamples of the output, one per row, drawn from the RandomState
+    random_state. The bin counts of a resample are multinomial in the bin fractions of the output (the values out of
+    range forming one more category), so they are drawn directly without resampling the values.'''
+    below = np.searchsorted(sorted_output, bin_locations, side='left')
+    below[-1] = np.searchsorted(sorted_output, bin_locations[-1], side='right')
+    counts = np.diff(below)
+    fractions = np.append(counts, len(sorted_output) - counts.sum()) / float(len(sorted_output))
+
+    resampled = random_state.multinomial(len(sorted_output), fractions, size=num_resamples)[:, :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return resampled / np.diff(bin_locations)[None, :] / resampled.sum(axis=1)[:, None]
+
+
+def resampled_kde(output, low, step, grid_size, bandwidth, num_resamples, random_state):
+    '''binned_kde of num_resamples bootstrap resamples of the output, one per row, drawn from the RandomState
+    random_state. Every value keeps its linear binning weights, so the grid counts of all resamples are two bincounts
+    over the drawn values.'''
+    position = (output - low) / step
+    left = np.clip(np.floor(position).astype(np.int64), 0, grid_size - 2)
+    right_weight = position - left
+
+    draws = random_state.randint(len(output), size=(num_resamples, len(output)))
+    cells = (grid_size * np.arange(num_resamples)[:, None] + left[draws]).ravel()
+    counts = np.bincount(cells, weights=1.0 - right_weight[draws].ravel(), minlength=num_resamples * grid_size) + \
+        np.bincount(cells + 1, weights=right_weight[draws].ravel(), minlength=num_resamples * grid_size)
+    return kernel_smooth(counts.reshape(num_resamples, grid_size), step, bandwidth) / len(output)
 
 
 class InformationCapacity(object):
 
-    def __init__(self, foreign_directory="./", self_directory="./", estimator='fd', limiting='foreign'):
-        self.num_steps = 1
+    def __init__(self, foreign_directory="./", self_directory="./", estimator='fd', limiting='foreign',
+                 num_resamples=0, seed=None):
         self.foreign_directory = foreign_directory
         self.self_directory = self_directory
 
-        self.foreign_output = np.loadtxt(foreign_directory + "output")
-        self.foreign_ligand = np.loadtxt(foreign_directory + "Ligand_concentrations")
-        self.self_output = np.loadtxt(self_directory + "output")
-        self.self_ligand = np.loadtxt(self_directory + "Ligand_concentrations")
-
         if os.path.exists(foreign_directory + "sample_0/column_names"):
             print("Loaded foreign column names")
             self.foreign_column = load(foreign_directory + "sample_0/column_names")
@@ -34,19 +167,39 @@ class InformationCapacity(object):
             self.self_column = load(self_directory + "column_names")
             self.self_column_names = self.self_column[0].split()
 
+        self.set_outputs(np.loadtxt(foreign_directory + "output"), np.loadtxt(self_directory + "output"),
+                         np.loadtxt(foreign_directory + "Ligand_concentrations"),
+                         np.loadtxt(self_directory + "Ligand_concentrations"), estimator, num_resamples, seed)
+
+    def set_outputs(self, foreign_output, self_output, foreign_ligand, self_ligand, estimator, num_resamples, seed):
+        '''Stores the outputs and computes the capacity, and its bootstrap interval unless num_resamples is 0.'''
+        self.num_steps = 1
+        self.foreign_output = foreign_output
+        self.foreign_ligand = foreign_ligand
+        self.self_output = self_output
+        self.self_ligand = self_ligand
+
         self.estimator = estimator
+        self.sort_outputs()
         self.capacity = self.calculate_ic()
+        self.capacity_ci = self.bootstrap(num_resamples, seed=seed) if num_resamples and estimator != 'knn' else None
+
+    def sort_outputs(self):
+        '''Sorts the outputs once; every histogram is then counted from them with searchsorted.'''
+        self.sorted_foreign = np.sort(np.ravel(self.foreign_output))
+        self.sorted_self = np.sort(np.ravel(self.self_output))
 
     def calculate_bins(self, num_bins=100):
-        count, self_bins = np.histogram(self.self_output, bins=self.estimator, density=True)
-        count, foreign_bins = np.histogram(self.foreign_output, bins=self.estimator, density=True)
+        # The edges np.histogram picks for either output span its data range, whatever the estimator
+        low = data_range(self.sorted_self)[0]
+        high = data_range(self.sorted_foreign)[1]
 
-        bins = np.linspace(min(self_bins), max(foreign_bins), num=num_bins)
+        bins = np.linspace(low, high, num=num_bins)
 
         return bins
 
     def count_cn(self, bin_locations):
-        count_cn, bins = np.histogram(self.foreign_output, bins=bin_locations, density=True)
+        count_cn = sorted_histogram(self.sorted_foreign, np.asarray(bin_locations, dtype=float))
 
         return count_cn
 
@@ -80,7 +233,7 @@ class InformationCapacity(object):
                                      label='P(Lf)')
 
     def count_dn(self, bin_locations):
-        count_dn, bins = np.histogram(self.self_output, bins=bin_locations, density=True)
+        count_dn = sorted_histogram(self.sorted_self, np.asarray(bin_locations, dtype=float))
         return count_dn
 
     def dn_mean_iqr(self):
@@ -105,54 +258,160 @@ class InformationCapacity(object):
         count, bins_ls, _ = plt.hist(self.self_ligand, bins=bins, align='mid', normed=True,
                                      label='P(Ls)')
 
-    def compute_bins(self):
-        number_of_bins = 50
-        bins = 0
-        p_0_integral = 0
-        while p_0_integral < 0.99:
-            bins = self.calculate_bins(num_bins=number_of_bins)
-            count_cn = self.count_cn(bins)
-            count_dn = self.count_dn(bins)
-            bin_width = bins[1] - bins[0]
+    def integrals(self, num_bins):
+        '''Histograms on num_bins edges with their p(O) and capacity integrals.'''
+        bins = self.calculate_bins(num_bins=num_bins)
+        count_cn = self.count_cn(bins)
+        count_dn = self.count_dn(bins)
+        bin_width = bins[1] - bins[0]
 
-            p_O = 0.5 * (count_cn + count_dn)
+        p_O = 0.5 * (count_cn + count_dn)
 
-            p_0_integral = np.trapz(p_O, dx=bin_width)
+        p_0_integral = trapz(p_O, dx=bin_width)
+
+        term_1_c0 = 0.5 * count_cn * np.nan_to_num(np.log2(count_cn / p_O))
+        term_2_d0 = 0.5 * count_dn * np.nan_to_num(np.log2(count_dn / p_O))
+        C = trapz(term_1_c0 + term_2_d0, dx=bin_width)
+
+        return bins, p_0_integral, C
+
+    def scan_bins(self, stop_on_equal=True):
+        '''First num_bins of 50, 100, ... at which the p(O) integral reaches 0.99 or, with stop_on_equal, equals C, as
+        found by adding 50 bins per histogram pass. Both densities integrate to one over the bins, so the trapezoidal
+        p(O) integral only falls short by half the end bins: 1 - (first + last bin fractions of both outputs) / 4. That
+        takes two searchsorted calls per bin count and is evaluated for bin_count_block counts at once; C equals the
+        integral exactly when no bin holds both outputs. Every candidate is confirmed on its full histograms, in order,
+        so rounding at the 0.99 threshold decides as in the pass-by-pass loop.'''
+        low, high = self.calculate_bins(num_bins=2)
+        first = 50
+        while True:
+            bin_counts = first + 50 * np.arange(bin_count_block)
+            foreign_first, foreign_last = end_bin_fractions(self.sorted_foreign, low, high, bin_counts)
+            self_first, self_last = end_bin_fractions(self.sorted_self, low, high, bin_counts)
+            p_0_integral = 1.0 - 0.25 * (foreign_first + foreign_last + self_first + self_last)
+
+            # Within rounding of 0.99 either way, or NaN when an output has nothing in range (which also ended the
+            # pass-by-pass loop); the full histograms decide
+            reached = (p_0_integral >= 0.99 - 1e-10) | np.isnan(p_0_integral)
+
+            # Runs of candidates up to the next one that may reach 0.99, checked in order for separation
+            start = 0
+            while start < len(bin_counts):
+                end = start + np.argmax(reached[start:]) + 1 if reached[start:].any() else len(bin_counts)
+                candidates = reached[start:end].copy()
+                if stop_on_equal:
+                    candidates |= separated(self.sorted_foreign, self.sorted_self, low, high, bin_counts[start:end])
+
+                for num_bins in bin_counts[start:end][candidates]:
+                    bins, p_0_integral, C = self.integrals(num_bins)
+                    if not p_0_integral < 0.99 or (stop_on_equal and p_0_integral == C):
+                        return num_bins
+
+                start = end
+
+            first += 50 * bin_count_block
 
-            number_of_bins += 50
+    def compute_bins(self):
+        bins = self.calculate_bins(num_bins=self.scan_bins(stop_on_equal=False))
 
         return bins
 
-    def calculate_ic(self):
-        number_of_bins = 50
-        C = 0
-        p_0_integral = 0
-        while p_0_integral < 0.99:
-            bins = self.calculate_bins(num_bins=number_of_bins)
-            count_cn = self.count_cn(bins)
-            count_dn = self.count_dn(bins)
-            bin_width = bins[1] - bins[0]
+    def kde_grid(self):
+        '''Grid shared by both densities, covering the outputs plus the kernel reach of the wider bandwidth.'''
+        self.foreign_bandwidth = silverman_bandwidth(self.sorted_foreign)
+        self.self_bandwidth = silverman_bandwidth(self.sorted_self)
+        reach = kde_cutoff * max(self.foreign_bandwidth, self.self_bandwidth)
 
-            p_O = 0.5 * (count_cn + count_dn)
+        low = min(self.sorted_self[0], self.sorted_foreign[0]) - reach
+        high = max(self.sorted_self[-1], self.sorted_foreign[-1]) + reach
 
-            p_0_integral = np.trapz(p_O, dx=bin_width)
-            print("p(O) integral = " + str(p_0_integral))
+        return np.linspace(low, high, num=kde_grid_size)
 
+    def kde_ic(self):
+        '''Capacity from Gaussian kernel densities of both outputs (Silverman bandwidths) on a shared grid. The grid
+        also serves as self.bins for the plots.'''
+        self.bins = self.kde_grid()
+        step = self.bins[1] - self.bins[0]
+        count_cn = binned_kde(self.sorted_foreign, self.bins[0], step, len(self.bins), self.foreign_bandwidth)
+        count_dn = binned_kde(self.sorted_self, self.bins[0], step, len(self.bins), self.self_bandwidth)
+
+        p_O = 0.5 * (count_cn + count_dn)
+        self.p0_integral = trapz(p_O, dx=step)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
             term_1_c0 = 0.5 * count_cn * np.nan_to_num(np.log2(count_cn / p_O))
             term_2_d0 = 0.5 * count_dn * np.nan_to_num(np.log2(count_dn / p_O))
-            C = np.trapz(term_1_c0 + term_2_d0, dx=bin_width)
-            print("C = " + str(C))
+        C = trapz(term_1_c0 + term_2_d0, dx=step)
+        print("p(O) integral = " + str(self.p0_integral))
+        print("C = " + str(C))
+
+        return C
+
+    def knn_ic(self, k=3, shuffles=10):
+        '''Capacity from the k-nearest-neighbour information estimate, corrected by its mean over shuffled inputs
+        (self.knn_bias). Binning only enters the plots, which use the 100-bin histograms.'''
+        C, self.knn_bias = knn_capacity(self.foreign_output, self.self_output, k=k, shuffles=shuffles)
+        self.bins, self.p0_integral, _ = self.integrals(100)
+        print("kNN bias = " + str(self.knn_bias))
+        print("C = " + str(C))
+
+        return C
+
+    def calculate_ic(self):
+        if self.estimator == 'kde':
+            return self.kde_ic()
+        if self.estimator == 'knn':
+            return self.knn_ic()
 
-            if p_0_integral == C:
-                print("C == P(O) integral: " + str(p_0_integral == C))
-                C = 1.00
-                print("New C " + str(C))
-                break
+        self.bins, self.p0_integral, C = self.integrals(self.scan_bins())
+        print("p(O) integral = " + str(self.p0_integral))
+        print("C = " + str(C))
 
-            number_of_bins += 50
+        if self.p0_integral == C:
+            print("C == P(O) integral: " + str(self.p0_integral == C))
+            C = 1.00
+            print("New C " + str(C))
 
         return C
 
+    def bootstrap(self, num_resamples=bootstrap_resamples, confidence=0.95, seed=None):
+        '''Basic bootstrap confidence interval of C, (2 C - q_high, 2 C - q_low) with q the percentiles of the
+        capacities of num_resamples resamples of both outputs, evaluated together on the bins (or kde grid and
+        bandwidths) of the point estimate; self.capacity_samples holds those capacities. The plug-in capacity is biased
+        upwards, and the resamples more so, so their percentiles themselves would sit above C; reflecting them about C
+        corrects for that bias, and the interval can lie below a strongly biased C. The resamples are drawn from
+        np.random.RandomState(seed), leaving the global random state untouched. Not available for estimator='knn'.'''
+        if self.estimator == 'knn':
+            raise ValueError("Bootstrap intervals are computed for the histogram and kde estimators only")
+
+        random_state = np.random.RandomState(seed)
+        step = self.bins[1] - self.bins[0]
+        if self.estimator == 'kde':
+            count_cn = resampled_kde(self.sorted_foreign, self.bins[0], step, len(self.bins), self.foreign_bandwidth,
+                                     num_resamples, random_state)
+            count_dn = resampled_kde(self.sorted_self, self.bins[0], step, len(self.bins), self.self_bandwidth,
+                                     num_resamples, random_state)
+        else:
+            count_cn = resampled_histograms(self.sorted_foreign, self.bins, num_resamples, random_state)
+            count_dn = resampled_histograms(self.sorted_self, self.bins, num_resamples, random_state)
+
+        p_O = 0.5 * (count_cn + count_dn)
+        p_0_integral = trapz(p_O, dx=step, axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            term_1_c0 = 0.5 * count_cn * np.nan_to_num(np.log2(count_cn / p_O))
+            term_2_d0 = 0.5 * count_dn * np.nan_to_num(np.log2(count_dn / p_O))
+        C = trapz(term_1_c0 + term_2_d0, dx=step, axis=1)
+        if self.estimator != 'kde':
+            C[p_0_integral == C] = 1.00
+
+        self.capacity_samples = C
+        low, high = np.nanpercentile(C, [50.0 * (1 - confidence), 50.0 * (1 + confidence)])
+        capacity_ci = (max(2 * self.capacity - high, 0.0), min(2 * self.capacity - low, 1.0))
+        print("C {0:.0f}% CI = [{1}, {2}]".format(100 * confidence, capacity_ci[0], capacity_ci[1]))
+
+        return capacity_ci
+
     def alternate_calculate_ic(self):
         bins = self.calculate_bins(num_bins=500)
         count_cn = self.count_cn(bins)
@@ -165,11 +424,23 @@ class InformationCapacity(object):
         h_o_i_term_1 = 0.5 * count_cn * np.nan_to_num(np.log2(count_cn))
         h_o_i_term_2 = 0.5 * count_dn * np.nan_to_num(np.log2(count_dn))
 
-        C = np.trapz(h_o + h_o_i_term_1 + h_o_i_term_2, dx=bin_width)
+        C = trapz(h_o + h_o_i_term_1 + h_o_i_term_2, dx=bin_width)
         print("C2 = " + str(C))
         return C
 
 
+class ArrayInformationCapacity(InformationCapacity):
+    '''Capacity of outputs held in memory rather than in output/Ligand_concentrations files.'''
+
+    def __init__(self, foreign_output, self_output, foreign_ligand=None, self_ligand=None, estimator='fd',
+                 num_resamples=0, seed=None):
+        self.foreign_directory = None
+        self.self_directory = None
+
+        self.set_outputs(np.asarray(foreign_output), np.asarray(self_output), foreign_ligand, self_ligand, estimator,
+                         num_resamples, seed)
+
+
 def check_binning():
     foreign_output = np.loadtxt("L_self/output")
     foreign_output_end_step = np.loadtxt("3_step_end_step/L_self/output")
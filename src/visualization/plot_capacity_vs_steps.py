@@ -12,6 +12,8 @@ if __name__ == "__main__":
     parser.add_argument('--steps', dest='steps', action='store', type=int, default=8,
                         help="number of KP steps.")
     parser.add_argument('--fb', dest='fb', action='store', type=float)
+    parser.add_argument('--estimator', dest='estimator', action='store', default='fd', choices=['fd', 'kde', 'knn'],
+                        help="Capacity estimator: refined histograms (fd), kernel densities or nearest neighbours.")
 
     args = parser.parse_args()
     steps = args.steps
@@ -30,7 +32,7 @@ if __name__ == "__main__":
 
         num_steps.append(i)
         ic_lf = InformationCapacity(foreign_directory=file_path + "Ls_Lf_{0}/".format(lf),
-                                    self_directory=file_path + "Ls/", limiting="self")
+                                    self_directory=file_path + "Ls/", estimator=args.estimator, limiting="self")
 
         if i == 1:
             xhi = 1500
@@ -33,25 +33,92 @@ class PostProcess(object):
         self.write_data()
 
 
-def average_trajectories(run_time, time_step):
-    all_data = []
-    num_files = len([name for name in os.listdir(".") if "hashed" in name])
-    print(num_files)
-    for i in range(1, num_files):
-        array = np.loadtxt("hashed_traj_{0}".format(i))
+class P2Quantile(object):
+    '''Streaming estimate of the p-quantile of every entry of a stream of equally shaped arrays (Jain and Chlamtac's
+    P-square algorithm), keeping five markers per entry instead of the arrays themselves.'''
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.first = []
+        self.increments = np.array([0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0])
+
+    def start(self):
+        shape = self.first[0].shape
+        self.heights = np.sort(np.array(self.first), axis=0)
+        self.positions = np.tile(np.arange(5.0).reshape((5,) + (1,) * len(shape)), (1,) + shape)
+        self.desired = np.tile((4.0 * self.increments).reshape((5,) + (1,) * len(shape)), (1,) + shape)
+
+    def add(self, x):
+        self.count += 1
+        if self.count <= 5:
+            self.first.append(np.array(x, dtype=float))
+            if self.count == 5:
+                self.start()
+            return
+
+        q = self.heights
+        n = self.positions
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+
+        # Every marker above the cell x falls into moves up one position
+        for i in range(1, 5):
+            n[i] += x < q[i]
+        n[4] = self.count - 1
+        self.desired += self.increments.reshape((5,) + (1,) * (self.desired.ndim - 1))
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            d = np.sign(d) * move
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                neighbour_height = np.where(d > 0, q[i + 1], q[i - 1])
+                neighbour_position = np.where(d > 0, n[i + 1], n[i - 1])
+                linear = q[i] + d * (neighbour_height - q[i]) / (neighbour_position - n[i])
+
+            use_parabolic = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(use_parabolic, parabolic, linear), q[i])
+            n[i] += d
+
+    def quantile(self):
+        if self.count < 5:
+            return np.percentile(np.array(self.first), 100 * self.p, axis=0)
+        return self.heights[2]
+
+
+def average_trajectories(run_time, time_step, num_files, quantiles=()):
+    '''Reads traj_1 ... traj_num_files once each and accumulates the mean and variance of the trajectories (Welford)
+    and, optionally, streaming estimates of the given quantiles. Only trajectories with the expected number of rows are
+    used. Writes mean_traj, var_traj and quantile_<p>_traj.'''
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    estimators = [P2Quantile(p) for p in quantiles]
+
+    for i in range(1, num_files + 1):
+        array = np.loadtxt("traj_{0}".format(i), skiprows=1)
         print(array.shape)
-        if float(array.shape[0]) == run_time/time_step:
-            all_data += [array]
-        elif run_time/time_step == 1:
-            all_data += [array]
-        # os.remove("hashed_traj_{0}".format(i))
+        if float(array.shape[0]) == run_time/time_step or run_time/time_step == 1:
+            count += 1
+            delta = array - mean
+            mean = mean + delta / count
+            m2 = m2 + delta * (array - mean)
 
-    np_all_data = np.array(all_data)
-    print(np_all_data.shape)
-    # all_data = np.array([np.loadtxt("hashed_traj_{0}".format(i)) for i in range(1, num_files)])
-    # print(all_data.shape)
-    average_trajectory = np.mean(all_data, axis=0)
-    np.savetxt("mean_traj", average_trajectory, fmt="%f")
+            for estimator in estimators:
+                estimator.add(array)
+
+    print(count)
+    variance = m2 / (count - 1) if count > 1 else np.zeros_like(mean)
+
+    np.savetxt("mean_traj", np.atleast_1d(mean), fmt="%f")
+    np.savetxt("var_traj", np.atleast_1d(variance), fmt="%f")
+    for estimator in estimators:
+        np.savetxt("quantile_{0}_traj".format(estimator.p), np.atleast_1d(estimator.quantile()), fmt="%f")
 
 
 if __name__ == "__main__":
@@ -63,6 +130,8 @@ if __name__ == "__main__":
                         help="run time for trajectories.")
     parser.add_argument('--time_step', dest='time_step', action='store', type=float,
                         help="time step used for simulations.")
+    parser.add_argument('--quantiles', dest='quantiles', action='store', type=float, nargs='*', default=[],
+                        help="quantiles of the trajectories to estimate, e.g. 0.25 0.5 0.75.")
 
     args = parser.parse_args()
 
@@ -72,9 +141,8 @@ if __name__ == "__main__":
     post_process = PostProcess("traj_1")
     post_process.write_columns()
 
-    num_files = len([name for name in os.listdir(".") if "traj" in name])
-    for i in range(num_files - 1):
-       post_process = PostProcess("traj_{0}".format(i+1))
-       post_process.main()
+    num_files = args.num_files
+    if not num_files:
+        num_files = len([name for name in os.listdir(".") if name.startswith("traj_")])
 
-    average_trajectories(run_time, time_step)
+    average_trajectories(run_time, time_step, num_files, quantiles=args.quantiles)
@@ -0,0 +1,39 @@
+import os
+import pickle
+
+import numpy as np
+
+from src.visualization.batch_capacity import batch_capacity, cache_file, table_file
+from tests.test_compute_ic import capacity, integer_outputs
+
+
+def write_run(run_directory, seed, lf=30):
+    foreign_output, self_output = integer_outputs(seed, n=300)
+    for condition, output in [("Ls_Lf_{0}".format(lf), foreign_output), ("Ls", self_output)]:
+        os.makedirs(os.path.join(run_directory, condition))
+        np.savetxt(os.path.join(run_directory, condition, "output"), output, fmt='%f')
+        np.savetxt(os.path.join(run_directory, condition, "Ligand_concentrations"), np.arange(len(output)), fmt='%f')
+    pickle.dump({'k_p': 0.1 * seed}, open(os.path.join(run_directory, "Ls", "parameters.pickle"), "wb"))
+    return capacity(foreign_output, self_output, num_resamples=0).capacity
+
+
+def test_only_new_or_changed_runs_are_computed(tmp_path, capsys):
+    directory = str(tmp_path)
+    capacities = [write_run(os.path.join(directory, "run_{0}".format(seed)), seed) for seed in [1, 2]]
+
+    table = batch_capacity(directory, num_resamples=0, workers=1)
+    assert "2 of 2 capacities to compute" in capsys.readouterr().out
+    np.testing.assert_allclose(table['C'], capacities)
+    np.testing.assert_allclose(table['k_p'], [0.1, 0.2])
+    assert os.path.exists(os.path.join(directory, cache_file))
+    assert os.path.exists(os.path.join(directory, table_file))
+
+    batch_capacity(directory, num_resamples=0, workers=1)
+    assert "0 of 2 capacities to compute" in capsys.readouterr().out
+
+    foreign_output, self_output = integer_outputs(5, n=400)
+    np.savetxt(os.path.join(directory, "run_2", "Ls", "output"), self_output, fmt='%f')
+    table = batch_capacity(directory, num_resamples=0, workers=1)
+    assert "1 of 2 capacities to compute" in capsys.readouterr().out
+    np.testing.assert_allclose(table['C'][0], capacities[0])
+    assert table['C'][1] != capacities[1]
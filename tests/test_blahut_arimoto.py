@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.visualization.blahut_arimoto import blahut_arimoto, channel_from_directories, discrete_channel, \
+    gaussian_channel
+
+
+def entropy(p):
+    return -np.sum(p * np.log2(p))
+
+
+def test_binary_symmetric_channel():
+    e = 0.1
+    C, p = blahut_arimoto([[1 - e, e], [e, 1 - e]], tolerance=1e-8)
+    np.testing.assert_allclose(C, 1 - entropy(np.array([e, 1 - e])), atol=1e-8)
+    np.testing.assert_allclose(p, [0.5, 0.5], atol=1e-6)
+
+
+def test_z_channel():
+    q = 0.3
+    C, p = blahut_arimoto([[1.0, 0.0], [q, 1 - q]], tolerance=1e-8)
+    np.testing.assert_allclose(C, np.log2(1 + (1 - q) * q ** (q / (1 - q))), atol=1e-8)
+    assert p[0] > 0.5
+
+
+def test_noiseless_and_duplicate_inputs():
+    channel = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [0.0, 0.0, 1.0]])
+    C, p = blahut_arimoto(channel, tolerance=1e-8)
+    np.testing.assert_allclose(C, np.log2(3), atol=1e-8)
+    np.testing.assert_allclose(p[2] + p[3], 1.0 / 3, atol=1e-6)
+
+
+def test_channel_rows_are_distributions():
+    bins = np.linspace(-10.0, 10.0, 201)
+    gaussian = gaussian_channel(np.array([-1.0, 2.0]), np.array([1.0, 0.0]), bins)
+    np.testing.assert_allclose(gaussian.sum(axis=1), 1.0)
+    np.testing.assert_allclose(gaussian.dot(0.5 * (bins[1:] + bins[:-1])), [-1.0, 2.0], atol=1e-3)
+
+    discrete = discrete_channel(np.array([0, 1, 2]), np.array([[0.5, 0.5, 0.0], [0.0, 0.0, 1.0]]), bins)
+    np.testing.assert_allclose(discrete.sum(axis=1), 1.0)
+
+
+def test_channel_from_directories(tmp_path):
+    lna = tmp_path / "lna"
+    lna.mkdir()
+    np.savetxt(str(lna / "output"), [0.0, 100.0])
+    np.savetxt(str(lna / "output_variance"), [1.0, 1.0])
+    np.savetxt(str(lna / "Ligand_concentrations"), [10.0, 20.0])
+    samples = tmp_path / "samples"
+    samples.mkdir()
+    np.savetxt(str(samples / "output"), np.linspace(45.0, 55.0, 100))
+
+    directories = [str(lna) + "/", str(samples) + "/"]
+    channel, labels, bins = channel_from_directories(directories, num_bins=500)
+    assert channel.shape == (3, 500)
+    assert labels == [directories[0] + " 10.0", directories[0] + " 20.0", directories[1]]
+
+    C, p = blahut_arimoto(channel, tolerance=1e-6)
+    np.testing.assert_allclose(C, np.log2(3), atol=1e-3)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from src.visualization.capacity_estimators import SortedIndex, TreeIndex, knn_capacity, knn_information
+from tests.test_compute_ic import gaussian_capacity
+
+
+def test_sorted_and_tree_indices_agree():
+    np.random.seed(8)
+    points = np.random.normal(size=(300, 1))
+    sorted_index = SortedIndex(points)
+    tree_index = TreeIndex(points)
+    for k in [1, 3]:
+        np.testing.assert_allclose(sorted_index.kth_distance(points, k), tree_index.kth_distance(points, k))
+    radius = np.random.uniform(0.0, 0.5, len(points))
+    np.testing.assert_array_equal(sorted_index.count(points, radius), tree_index.count(points, radius))
+
+
+@pytest.mark.parametrize("dimensions", [1, 2])
+def test_knn_information_of_gaussian_outputs(dimensions):
+    np.random.seed(9)
+    shift = 2.0 / np.sqrt(dimensions)
+    groups = [np.random.normal(shift, 1.0, (5000, dimensions)), np.random.normal(0.0, 1.0, (5000, dimensions))]
+    np.testing.assert_allclose(knn_information(groups), gaussian_capacity(2.0), atol=0.02)
+
+
+def test_knn_capacity_of_identical_outputs_is_small():
+    np.random.seed(10)
+    C, bias = knn_capacity(np.round(np.random.lognormal(3.0, 0.5, 2000)), np.round(np.random.lognormal(3.0, 0.5, 2000)))
+    assert C < 0.01
+    assert abs(bias) < 0.02
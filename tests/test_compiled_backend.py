@@ -0,0 +1,35 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from src.data.compiled_backend import CompiledNetwork, compile_network, generate_source
+from tests.test_mass_action_network import dimer_network
+
+compiler = pytest.mark.skipif(shutil.which("cc") is None, reason="needs a C compiler")
+
+
+def test_source_has_every_species():
+    source = generate_source(dimer_network())
+    assert source.count("dydt[") == 4
+    assert "void jac(const double *y, const double *k, double *J)" in source
+
+
+@compiler
+def test_compiled_matches_python_network(tmp_path):
+    network = dimer_network()
+    library_path = str(tmp_path / "dimer.so")
+    compile_network(network, library_path)
+    compiled = CompiledNetwork(network, library_path)
+
+    k = network.rate_constants()
+    y = np.array([30.0, 20.0, 5.0, 1.0])
+    np.testing.assert_allclose(compiled.rhs(y, 0.0, k), network.rhs(y[None])[0], rtol=1e-12)
+    np.testing.assert_allclose(compiled.jacobian(y, 0.0, k), network.jacobian(y[None])[0], rtol=1e-12)
+
+    y0 = network.initial_states('A_0', [80.0])
+    tspan = np.linspace(0, 100.0, 11)
+    np.testing.assert_allclose(compiled.integrate(y0[0], tspan, rtol=1e-8, atol=1e-8), network.integrate(y0, tspan)[0],
+                               rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(compiled.integrate(y0[0], tspan, observables=['O_C'])[:, 0],
+                               network.integrate(y0, tspan, observables=['O_C'])[0, :, 0], rtol=1e-4, atol=1e-4)
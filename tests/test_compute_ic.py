@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+from scipy.integrate import quad
+from scipy.stats import norm
+
+from src.visualization.compute_ic import ArrayInformationCapacity, InformationCapacity, binned_kde, \
+    resampled_histograms, resampled_kde, trapz
+
+
+def original_scan(foreign_output, self_output, stop_on_equal=True):
+    '''The pass-by-pass refinement calculate_ic used before the sorted-data engine: 50 more bins per pass, each pass
+    histogrammed with np.histogram.'''
+    low = np.histogram(self_output, bins='fd')[1].min()
+    high = np.histogram(foreign_output, bins='fd')[1].max()
+    num_bins = 50
+    while True:
+        bins = np.linspace(low, high, num=num_bins)
+        count_cn = np.histogram(foreign_output, bins=bins, density=True)[0]
+        count_dn = np.histogram(self_output, bins=bins, density=True)[0]
+        bin_width = bins[1] - bins[0]
+        p_O = 0.5 * (count_cn + count_dn)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p_0_integral = trapz(p_O, dx=bin_width)
+            C = trapz(0.5 * count_cn * np.nan_to_num(np.log2(count_cn / p_O)) +
+                      0.5 * count_dn * np.nan_to_num(np.log2(count_dn / p_O)), dx=bin_width)
+        if stop_on_equal and p_0_integral == C:
+            return num_bins, 1.00
+        if not p_0_integral < 0.99:
+            return num_bins, C
+        num_bins += 50
+
+
+def integer_outputs(seed, n=1000):
+    '''Molecule-count-like outputs: rounded lognormals, so many values sit exactly on bin edges.'''
+    random_state = np.random.RandomState(seed)
+    scale = random_state.uniform(2.0, 200.0)
+    foreign_output = np.round(random_state.lognormal(np.log(scale) + random_state.uniform(0.0, 1.5),
+                                                     random_state.uniform(0.2, 1.0), n))
+    self_output = np.round(random_state.lognormal(np.log(scale), random_state.uniform(0.2, 1.0), n))
+    return foreign_output, self_output
+
+
+def capacity(foreign_output, self_output, **kwargs):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ArrayInformationCapacity(foreign_output, self_output, **kwargs)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_scan_bins_matches_original_loop(seed):
+    foreign_output, self_output = integer_outputs(seed, n=[1000, 200, 500][seed % 3])
+    ic = capacity(foreign_output, self_output, num_resamples=0)
+
+    num_bins, C = original_scan(foreign_output, self_output)
+    assert len(ic.bins) == num_bins
+    assert ic.capacity == C
+    with np.errstate(divide='ignore', invalid='ignore'):
+        num_bins = ic.scan_bins(stop_on_equal=False)
+    assert num_bins == original_scan(foreign_output, self_output, stop_on_equal=False)[0]
+
+
+def test_separated_outputs_have_unit_capacity():
+    ic = capacity(np.arange(500.0, 600.0), np.arange(0.0, 100.0), num_resamples=0)
+    assert ic.capacity == 1.00
+    assert len(ic.bins) == original_scan(np.arange(500.0, 600.0), np.arange(0.0, 100.0))[0]
+
+
+def test_directory_and_array_capacities_agree(tmp_path):
+    foreign_output, self_output = integer_outputs(3)
+    for name, output in [("foreign", foreign_output), ("self", self_output)]:
+        (tmp_path / name).mkdir()
+        np.savetxt(str(tmp_path / name / "output"), output, fmt='%f')
+        np.savetxt(str(tmp_path / name / "Ligand_concentrations"), np.arange(len(output)), fmt='%f')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ic = InformationCapacity(foreign_directory=str(tmp_path / "foreign") + "/",
+                                 self_directory=str(tmp_path / "self") + "/", num_resamples=0)
+    assert ic.capacity == capacity(foreign_output, self_output, num_resamples=0).capacity
+    assert ic.capacity_ci is None
+    np.testing.assert_array_equal(ic.self_ligand, np.arange(len(self_output)))
+
+
+def gaussian_capacity(separation):
+    '''Capacity of unit Gaussian outputs separation apart with equal priors, by quadrature.'''
+    def integrand(x):
+        p_O = 0.5 * (norm.pdf(x) + norm.pdf(x, separation))
+        return sum(0.5 * norm.pdf(x, mean) * np.log2(norm.pdf(x, mean) / p_O) for mean in (0.0, separation))
+    return quad(integrand, -12.0, separation + 12.0)[0]
+
+
+@pytest.mark.parametrize("estimator", ['fd', 'kde'])
+@pytest.mark.parametrize("seed", range(5))
+def test_bootstrap_interval_covers_true_capacity(estimator, seed):
+    # Strongly overlapping outputs, where the plug-in capacity is biased upwards by about as much as its spread
+    random_state = np.random.RandomState(100 + seed)
+    foreign_output = 500.0 + 20.0 * random_state.normal(0.5, 1.0, 1000)
+    self_output = 500.0 + 20.0 * random_state.normal(0.0, 1.0, 1000)
+    ic = capacity(foreign_output, self_output, estimator=estimator, num_resamples=200, seed=seed)
+
+    low, high = ic.capacity_ci
+    assert low <= gaussian_capacity(0.5) <= high
+    assert len(ic.capacity_samples) == 200
+
+
+def test_bootstrap_is_opt_in_and_leaves_the_global_random_state():
+    foreign_output, self_output = integer_outputs(5)
+    assert capacity(foreign_output, self_output).capacity_ci is None
+
+    np.random.seed(13)
+    expected = np.random.random()
+    np.random.seed(13)
+    first = capacity(foreign_output, self_output, estimator='kde', num_resamples=50, seed=1)
+    assert np.random.random() == expected
+
+    second = capacity(foreign_output, self_output, estimator='kde', num_resamples=50, seed=1)
+    assert first.capacity_ci == second.capacity_ci
+    np.testing.assert_array_equal(first.capacity_samples, second.capacity_samples)
+
+
+def test_resampled_histograms_average_to_histogram():
+    foreign_output, self_output = integer_outputs(3)
+    ic = capacity(foreign_output, self_output, num_resamples=0)
+    resampled = resampled_histograms(ic.sorted_foreign, ic.bins, 4000, np.random.RandomState(0))
+
+    histogram = np.histogram(foreign_output, bins=ic.bins, density=True)[0]
+    assert np.allclose(resampled.mean(axis=0), histogram, atol=0.05 * histogram.max())
+    assert np.allclose(resampled.dot(np.diff(ic.bins)), 1.0)
+
+
+def test_resampled_kde_averages_to_kde():
+    foreign_output, self_output = integer_outputs(4)
+    ic = capacity(foreign_output, self_output, estimator='kde', num_resamples=0)
+    step = ic.bins[1] - ic.bins[0]
+    resampled = resampled_kde(ic.sorted_foreign, ic.bins[0], step, len(ic.bins), ic.foreign_bandwidth, 2000,
+                              np.random.RandomState(0))
+
+    density = binned_kde(ic.sorted_foreign, ic.bins[0], step, len(ic.bins), ic.foreign_bandwidth)
+    assert np.allclose(resampled.mean(axis=0), density, atol=0.01 * density.max())
+
+
+def test_binned_kde_matches_direct_sum():
+    np.random.seed(6)
+    output = np.random.normal(10.0, 2.0, 500)
+    grid = np.linspace(0.0, 20.0, 2048)
+    bandwidth = 0.7
+    density = binned_kde(output, grid[0], grid[1] - grid[0], len(grid), bandwidth)
+
+    direct = norm.pdf(grid[:, None], output[None, :], bandwidth).mean(axis=1)
+    np.testing.assert_allclose(density, direct, atol=1e-4 * direct.max())
+
+
+@pytest.mark.parametrize("separation", [1.0, 2.0])
+def test_kde_capacity_of_gaussian_outputs(separation):
+    random_state = np.random.RandomState(7)
+    foreign_output = 20.0 * random_state.normal(separation, 1.0, 20000)
+    self_output = 20.0 * random_state.normal(0.0, 1.0, 20000)
+    ic = capacity(foreign_output, self_output, estimator='kde', num_resamples=0)
+    np.testing.assert_allclose(ic.capacity, gaussian_capacity(separation), atol=0.01)
+    np.testing.assert_allclose(ic.p0_integral, 1.0, atol=1e-3)
@@ -0,0 +1,43 @@
+import numpy as np
+from scipy.stats import binom, poisson
+
+from src.data.stochastic_simulation import from_reaction_lists
+from src.models.finite_state_projection import FiniteStateProjection, capacity, mixture
+
+
+def test_decay_is_binomial():
+    network = from_reaction_lists([[[["A"], ["B"]]]], [{"A_B": 0.3}], n_initial={"A": 1, "B": 0})
+    initial_states = [[n, 0] for n in [5, 12, 20]]
+
+    fsp = FiniteStateProjection(network, tolerance=1e-8)
+    values, distribution = fsp.output_distribution(initial_states, 2.0, np.array([1, 0]))
+
+    survival = np.exp(-0.3 * 2.0)
+    for (n, b), row in zip(initial_states, distribution):
+        np.testing.assert_allclose(row, binom.pmf(values, n, survival), atol=1e-10)
+    assert fsp.error.max() < 1e-8
+
+
+def test_birth_death_is_poisson():
+    network = from_reaction_lists([[[[], ["A"]], [["A"], []]]], [{"_A": 4.0, "A_": 0.5}], n_initial={"A": 0})
+
+    fsp = FiniteStateProjection(network, tolerance=1e-6, layers=5)
+    values, distribution = fsp.output_distribution([[0], [3]], 3.0, np.array([1]))
+
+    survival = np.exp(-0.5 * 3.0)
+    born = poisson.pmf(values, 8.0 * (1 - survival))
+    np.testing.assert_allclose(distribution[0], born, atol=1e-6)
+    np.testing.assert_allclose(distribution[1], np.convolve(born, binom.pmf(np.arange(4), 3, survival))[:len(values)],
+                               atol=1e-6)
+    assert fsp.error.max() <= 1e-6
+
+
+def test_mixture_and_capacity():
+    distribution = np.array([[1.0, 0.0, 0.0], [0.0, 0.5, 0.5]])
+    np.testing.assert_allclose(mixture(distribution, [1, 3]), [0.25, 0.375, 0.375])
+
+    values = np.array([0, 1, 2])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        assert capacity(values, distribution[0], values, distribution[0]) == 0.0
+        np.testing.assert_allclose(capacity(values, distribution[0], values + 3, distribution[0]), 1.0)
+        np.testing.assert_allclose(capacity(values, distribution[0], values, distribution[1]), 1.0)
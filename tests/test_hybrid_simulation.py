@@ -0,0 +1,74 @@
+import numpy as np
+
+from src.data.hybrid_simulation import HybridSimulator
+from src.data.mass_action_network import MassActionNetwork
+from src.data.stochastic_simulation import GillespieDirect
+from src.models.finite_state_projection import FiniteStateProjection
+from tests.test_mass_action_network import dimer_network
+
+
+def test_abundant_species_follow_the_ode():
+    network = dimer_network()
+    y0 = network.initial_states('A_0', [80.0])[0]
+    times = np.linspace(1.0, 10.0, 4)
+
+    y = HybridSimulator(network, threshold=0, rtol=1e-8, atol=1e-8).simulate(y0, times)
+    np.testing.assert_allclose(y, network.integrate(y0[None], np.append(0.0, times))[0, 1:], rtol=1e-4, atol=1e-4)
+
+
+def test_rare_species_match_finite_state_projection():
+    network = dimer_network()
+    y0 = np.array([10.0, 6.0, 0.0, 0.0])
+    simulator = HybridSimulator(network, threshold=1000)
+
+    fsp = FiniteStateProjection(simulator.stochastic_network, tolerance=1e-10)
+    p = fsp.solve([simulator.stochastic_network.initial_counts({"A": 10, "B": 6})], 2.0)[0]
+    exact_mean = p.dot(fsp.states)
+    exact_variance = p.dot(fsp.states ** 2) - exact_mean ** 2
+
+    np.random.seed(4)
+    num_trajectories = 2000
+    trajectories = np.array([simulator.simulate(y0, [2.0])[-1] for j in range(num_trajectories)])
+    assert np.all(np.abs(trajectories.mean(axis=0) - exact_mean) <= 4 * np.sqrt(exact_variance / num_trajectories))
+    np.testing.assert_allclose(trajectories.var(axis=0, ddof=1), exact_variance, rtol=0.15, atol=1e-3)
+
+
+def receptor_binding_network():
+    '''Abundant R with slow turnover (0 -> R, R -> 0) binding 30 ligands quickly: R + L <-> C.'''
+    reactants = np.array([[3, 3], [0, 3], [0, 1], [2, 3]])
+    stoichiometry = np.array([[1, -1, -1, 1], [0, 0, -1, 1], [0, 0, 1, -1]], dtype=float)
+    return MassActionNetwork(["R", "L", "C"], ["kb", "kd", "kon", "koff"], [100.0, 0.1, 0.02, 20.0], reactants,
+                             stoichiometry, np.ones(4), np.arange(4), np.array([-1, -1, -1]), ["O_C"],
+                             np.array([[0.0, 0.0, 1.0]]))
+
+
+def test_fast_low_copy_binding_fires_between_integrations():
+    network = receptor_binding_network()
+    y0 = np.array([1000.0, 30.0, 0.0])
+    simulator = HybridSimulator(network, threshold=100, time_step=0.2)
+    assert list(simulator.partition(y0)[1]) == [True, True, False, False]
+
+    np.random.seed(11)
+    num_trajectories = 100
+    hybrid = np.array([simulator.simulate(y0, [1.0])[-1] for j in range(num_trajectories)])
+    assert simulator.num_integrations == 2 * 5 * num_trajectories
+    assert simulator.num_events > 20 * simulator.num_integrations
+
+    ssa = GillespieDirect(simulator.stochastic_network)
+    exact = np.array([ssa.simulate(y0.astype(np.int64), [1.0])[-1] for j in range(num_trajectories)])
+    standard_error = np.sqrt((hybrid.var(axis=0) + exact.var(axis=0)) / num_trajectories)
+    assert np.all(np.abs(hybrid.mean(axis=0) - exact.mean(axis=0)) <= 4 * standard_error)
+    np.testing.assert_allclose(hybrid[:, 2].var(), exact[:, 2].var(), rtol=0.5)
+
+
+def test_species_falling_below_threshold_become_discrete():
+    network = MassActionNetwork(["A"], ["k", "A_0"], [1.0, 1000.0], np.array([[0]]), np.array([[-1.0]]),
+                                np.ones(1), np.array([0]), np.array([1]), [], np.zeros((0, 1)))
+    simulator = HybridSimulator(network, threshold=100, time_step=1.0)
+
+    np.random.seed(12)
+    num_trajectories = 100
+    y = np.array([simulator.simulate([1000.0], [5.0])[-1, 0] for j in range(num_trajectories)])
+    np.testing.assert_array_equal(y, np.round(y))
+    assert simulator.num_events > 0
+    assert abs(y.mean() - 1000.0 * np.exp(-5.0)) <= 4 * np.sqrt(1000.0 * np.exp(-5.0) / num_trajectories)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from src.data.linear_noise import LinearNoiseApproximation
+from src.data.mass_action_network import MassActionNetwork
+from tests.test_parameter_sweep import binding_network
+
+
+def test_birth_death_variance_equals_mean():
+    network = MassActionNetwork(["A"], ["kb", "kd"], [20.0, 0.5], np.array([[1], [0]]), np.array([[1.0, -1.0]]),
+                                np.ones(2), np.array([0, 1]), np.array([-1]), ["O_A"], np.ones((1, 1)))
+    np.testing.assert_allclose(LinearNoiseApproximation(network).covariance(np.array([40.0])), [[40.0]])
+
+
+def test_binding_variance():
+    network = binding_network()
+    ligand = np.array([10.0, 50.0, 400.0])
+    b = 100.0 + ligand + 0.5 / 0.01
+    complex_ = (b - np.sqrt(b ** 2 - 400.0 * ligand)) / 2
+    steady_states = np.stack([100.0 - complex_, ligand - complex_, complex_], axis=1)
+
+    lna = LinearNoiseApproximation(network)
+    expected = 1.0 / (1.0 / steady_states[:, 0] + 1.0 / steady_states[:, 1] + 1.0 / steady_states[:, 2])
+    np.testing.assert_allclose(lna.output_variance(steady_states, ["O_C"]), expected, rtol=1e-8)
+    # R + C is conserved, so R varies exactly as much as C
+    np.testing.assert_allclose(lna.output_variance(steady_states, ["O_R"]), expected, rtol=1e-8)
+    np.testing.assert_allclose(lna.output_variance(steady_states, ["O_C", "O_R"]), 0.0, atol=1e-8)
@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.data.mass_action_network import MassActionNetwork
+
+
+def dimer_network():
+    '''A + B <-> C and A + A -> D, with the initial A set by the parameter A_0.'''
+    reactants = np.array([[0, 1], [2, 4], [0, 0]])
+    stoichiometry = np.array([[-1, 1, -2], [-1, 1, 0], [1, -1, 0], [0, 0, 1]], dtype=float)
+    return MassActionNetwork(["A", "B", "C", "D"], ["kon", "koff", "kd", "A_0", "B_0"], [0.01, 0.5, 0.001, 0.0, 50.0],
+                             reactants, stoichiometry, np.array([1.0, 1.0, 0.5]), np.array([0, 1, 2]),
+                             np.array([3, 4, -1, -1]), ["O_C", "O_AC"], np.array([[0, 0, 1, 0], [1, 0, 1, 0.0]]))
+
+
+def test_initial_states_set_the_parameter_column():
+    y0 = dimer_network().initial_states('A_0', [10.0, 20.0])
+    np.testing.assert_allclose(y0, [[10.0, 50.0, 0.0, 0.0], [20.0, 50.0, 0.0, 0.0]])
+
+
+def test_jacobian_matches_finite_differences():
+    network = dimer_network()
+    y = np.array([[30.0, 20.0, 5.0, 1.0], [3.0, 40.0, 2.0, 0.0]])
+    jacobian = network.jacobian(y)
+
+    h = 1e-6
+    for i in range(network.num_species):
+        shift = np.zeros(network.num_species)
+        shift[i] = h
+        numeric = (network.rhs(y + shift) - network.rhs(y - shift)) / (2 * h)
+        np.testing.assert_allclose(jacobian[:, :, i], numeric, rtol=1e-6, atol=1e-10)
+
+
+def test_batch_matches_separate_integrations():
+    network = dimer_network()
+    y0 = network.initial_states('A_0', [5.0, 80.0, 400.0])
+    tspan = np.linspace(0, 100.0, 11)
+
+    batch = network.integrate(y0, tspan)
+    for row, y in zip(y0, batch):
+        np.testing.assert_allclose(y, network.integrate(row[None], tspan)[0], rtol=1e-5, atol=1e-4)
+
+    # A + 2 D + C and B + C are conserved
+    totals = batch[:, :, 0] + batch[:, :, 2] + 2 * batch[:, :, 3]
+    np.testing.assert_allclose(totals, np.repeat(y0[:, [0]], len(tspan), axis=1), rtol=1e-6)
+    np.testing.assert_allclose(batch[:, :, 1] + batch[:, :, 2], 50.0, rtol=1e-6)
+
+    observables = network.integrate(y0, tspan[[0, -1]], observables=['O_AC'])
+    assert observables.shape == (3, 2, 1)
+    np.testing.assert_allclose(observables[:, -1, 0], batch[:, -1, 0] + batch[:, -1, 2], rtol=1e-4)
+
+
+def test_decay_is_exponential():
+    network = MassActionNetwork(["A", "B"], ["k", "A_0"], [0.3, 0.0], np.array([[0]]), np.array([[-1.0], [1.0]]),
+                                np.ones(1), np.array([0]), np.array([1, -1]), [], np.zeros((0, 2)))
+    tspan = np.linspace(0, 10.0, 6)
+    y = network.integrate(network.initial_states('A_0', [1.0, 100.0]), tspan)
+    np.testing.assert_allclose(y[:, :, 0], np.outer([1.0, 100.0], np.exp(-0.3 * tspan)), rtol=1e-5, atol=1e-5)
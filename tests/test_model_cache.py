@@ -0,0 +1,53 @@
+from src.data.model_cache import ModelCache
+from src.data.pysb_t_cell_network import PysbTcrSelfWithForeign
+from src.data.simulation_parameters import BindingParameters, InitialConcentrations
+
+
+def tcr(steps=8, self_foreign=False, parameters=None):
+    '''Model with only the attributes the key reads, without drawing ligands or reading parameters.pickle.'''
+    model = PysbTcrSelfWithForeign.__new__(PysbTcrSelfWithForeign)
+    model.steps = steps
+    model.self_foreign = self_foreign
+    model.lf = 30
+    model.p_flag = parameters is not None
+    model.parameters = parameters
+    model.rate_constants = BindingParameters()
+    model.initial_conditions = InitialConcentrations()
+    return model
+
+
+def test_key_depends_on_the_network_description():
+    cache = ModelCache()
+    key = cache.key(tcr())
+    assert cache.key(tcr()) == key
+    assert cache.key(tcr(steps=7)) != key
+    assert cache.key(tcr(self_foreign=True)) != key
+    assert cache.key(tcr(parameters={'k_8_1': 0.01})) != key
+    assert cache.key(tcr(parameters={'k_8_1': 0.01})) != cache.key(tcr(parameters={'k_8_1': 0.02}))
+
+
+def test_store_and_load(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    assert cache.load("missing") is None
+
+    cache.store("entry", {'observables': ["O_Ls"], 'rules': "text"})
+    assert cache.load("entry") == {'observables': ["O_Ls"], 'rules': "text"}
+    assert (tmp_path / "models" / "entry.pickle").exists()
+
+
+def test_changed_defaults_miss_the_cache(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    cache.store(cache.key(tcr()), {'observables': ["O_Ls"]})
+    assert cache.load(cache.key(tcr())) == {'observables': ["O_Ls"]}
+
+    model = tcr()
+    model.rate_constants.k_sos_on *= 2
+    assert cache.load(cache.key(model)) is None
+
+    model = tcr()
+    model.initial_conditions.lat_0 += 1
+    assert cache.load(cache.key(model)) is None
+
+    model = tcr()
+    model.rate_constants.initial.r_0 += 1
+    assert cache.load(cache.key(model)) is None
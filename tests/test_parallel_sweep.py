@@ -0,0 +1,113 @@
+import numpy as np
+import pysb.bng
+import pysb.pathfinder
+import pytest
+
+import src.data.pysb_t_cell_network as pysb_t_cell_network
+from src.data.pysb_ras_sos import SoSFeedback
+from src.general.parallel_sweep import parallel_sweep
+from src.models.pysb_toy_model import ToyModel
+
+
+class ScaledModel(object):
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.offset = 0
+
+    def make_model(self):
+        return ["x"]
+
+    def solve_ligand(self, ligand, observables, time_index=-1):
+        return (ligand * self.scale + self.offset, observables[0], time_index)
+
+
+def test_parallel_sweep_sets_attributes_in_order():
+    results = parallel_sweep(ScaledModel, {'scale': 2}, list(range(10)), 2, -1, attributes={'offset': 1})
+    assert results == [(2 * i + 1, "x", -1) for i in range(10)]
+
+
+def test_solve_samples_forwards_sparse_output(monkeypatch):
+    calls = []
+
+    def iterate_parallel_sweep(model_class, init_kwargs, samples, workers, time_index, attributes):
+        calls.append((init_kwargs, attributes))
+        return iter([])
+
+    monkeypatch.setattr(pysb_t_cell_network, 'iterate_parallel_sweep', iterate_parallel_sweep)
+    tcr = pysb_t_cell_network.PysbTcrSelfWithForeign(steps=2)
+    tcr.backend = "compiled"
+    tcr.sparse_output = True
+    tcr.num_samples = 20
+    list(tcr.solve_samples([1, 2], ["Ls"], workers=2))
+
+    assert calls == [({'steps': 2, 'self_foreign': False, 'lf': 30},
+                      {'backend': "compiled", 'sparse_output': True, 'num_samples': 20})]
+
+
+def site_free_network(model):
+    '''Lines of the BioNetGen .net file of a model whose monomers have no sites, so that every pattern is a species of
+    its own and every rule a single mass-action reaction.'''
+    names = [monomer.name for monomer in model.monomers]
+
+    def indices(reaction_pattern):
+        return ",".join(str(names.index(complex_pattern.monomer_patterns[0].monomer.name) + 1)
+                        for complex_pattern in reaction_pattern.complex_patterns) or "0"
+
+    lines = ["begin parameters", "end parameters", "begin species"]
+    lines += ["{0} {1}() 0".format(i + 1, name) for i, name in enumerate(names)]
+    lines += ["end species", "begin reactions"]
+    for rule in model.rules:
+        reactants, products = indices(rule.reactant_pattern), indices(rule.product_pattern)
+        lines.append("0 {0} {1} {2} #{3}".format(reactants, products, rule.rate_forward.name, rule.name))
+        if rule.is_reversible:
+            lines.append("0 {0} {1} {2} #_reverse_{3}".format(products, reactants, rule.rate_reverse.name, rule.name))
+    lines += ["end reactions", "begin groups"]
+    lines += ["{0} {1} {2}".format(i + 1, observable.name, indices(observable.reaction_pattern))
+              for i, observable in enumerate(model.observables)]
+    return lines + ["end groups"]
+
+
+@pytest.fixture
+def network_generation(monkeypatch):
+    '''Expands the site-free toy models without BioNetGen where it is not installed. Pool workers are forked, so
+    they inherit the replacement.'''
+    try:
+        pysb.pathfinder.get_path('bng')
+    except Exception:
+        def generate_equations(model, cleanup=True, verbose=False, **kwargs):
+            if not model.reactions:
+                pysb.bng._parse_netfile(model, iter(site_free_network(model)))
+        monkeypatch.setattr(pysb.bng, 'generate_equations', generate_equations)
+
+
+def sweep_files(model, workers, names):
+    model.main(workers=workers)
+    return [open(name).read() for name in names]
+
+
+def test_toy_model_sweep_matches_serial(network_generation, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    names = ["Ligand_concentrations", "output", "ls_ss", "r_ss"]
+
+    sweeps = []
+    for workers in [1, 2]:
+        np.random.seed(15)
+        tcr = ToyModel()
+        tcr.p_ligand = tcr.p_ligand[:6]
+        sweeps.append(sweep_files(tcr, workers, names))
+
+    assert sweeps[0] == sweeps[1]
+    assert len(set(np.loadtxt("output"))) == 6
+
+
+def test_sos_feedback_sweep_matches_serial(network_generation, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    sweeps = []
+    for workers in [1, 2]:
+        sos = SoSFeedback()
+        sos.sos = sos.sos[::10]
+        sweeps.append(sweep_files(sos, workers, ["sos_rasgtp"]))
+
+    assert sweeps[0] == sweeps[1]
+    assert len(sweeps[0][0].splitlines()) == 5
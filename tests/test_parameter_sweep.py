@@ -0,0 +1,44 @@
+import numpy as np
+
+from src.data.mass_action_network import MassActionNetwork
+from src.data.parameter_sweep import ParameterSweep
+
+
+def binding_network():
+    '''R + Ls <-> C with on rate k_sos_on, so the k_8_1 alias of parameters.pickle applies to it.'''
+    reactants = np.array([[0, 1], [2, 3]])
+    stoichiometry = np.array([[-1, 1], [-1, 1], [1, -1]], dtype=float)
+    return MassActionNetwork(["R", "Ls", "C"], ["k_sos_on", "koff", "R_0", "Ls_0"], [0.01, 0.5, 100.0, 0.0],
+                             reactants, stoichiometry, np.ones(2), np.array([0, 1]), np.array([2, 3, -1]),
+                             ["O_C", "O_R"], np.array([[0.0, 0.0, 1.0], [1.0, 0.0, 0.0]]))
+
+
+def sweep(steady_state):
+    parameter_sweep = ParameterSweep.__new__(ParameterSweep)
+    parameter_sweep.steady_state = steady_state
+    parameter_sweep.run_time = 1000.0
+    parameter_sweep.tspan = np.linspace(0, 1000.0)
+    return parameter_sweep
+
+
+def test_set_parameters_resolves_aliases_and_resets():
+    network = binding_network()
+    default_values = network.parameter_values.copy()
+
+    sweep(False).set_parameters(network, default_values, ['k_8_1', 'koff', 'unknown'], [0.02, 0.1, 5.0])
+    np.testing.assert_allclose(network.parameter_values, [0.02, 0.1, 100.0, 0.0])
+
+    sweep(False).set_parameters(network, default_values, [], [])
+    np.testing.assert_allclose(network.parameter_values, default_values)
+
+
+def test_integrated_and_steady_outputs_agree():
+    network = binding_network()
+    ligand = np.array([10.0, 50.0, 400.0])
+
+    steady = sweep(True).solve(network, ["O_C"], ligand)
+    integrated = sweep(False).solve(network, ["O_C"], ligand)
+
+    b = 100.0 + ligand + 0.5 / 0.01
+    np.testing.assert_allclose(steady, (b - np.sqrt(b ** 2 - 400.0 * ligand)) / 2, rtol=1e-8)
+    np.testing.assert_allclose(integrated, steady, rtol=1e-5)
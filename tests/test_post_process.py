@@ -0,0 +1,35 @@
+import numpy as np
+
+from src.visualization.post_process import P2Quantile, average_trajectories
+
+
+def test_p2_quantiles_match_percentiles():
+    np.random.seed(2)
+    samples = np.random.exponential(size=(5000, 3, 2)) * np.array([1.0, 10.0])
+    for p in [0.1, 0.5, 0.9]:
+        estimator = P2Quantile(p)
+        for x in samples:
+            estimator.add(x)
+        np.testing.assert_allclose(estimator.quantile(), np.percentile(samples, 100 * p, axis=0), rtol=0.05)
+
+
+def test_p2_quantile_of_few_samples_is_exact():
+    estimator = P2Quantile(0.5)
+    for x in [3.0, 1.0, 2.0]:
+        estimator.add(np.array([x]))
+    np.testing.assert_allclose(estimator.quantile(), [2.0])
+
+
+def test_average_trajectories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    np.random.seed(3)
+    trajectories = np.random.poisson(20.0, size=(6, 4, 2)).astype(float)
+    for i, trajectory in enumerate(trajectories):
+        np.savetxt("traj_{0}".format(i + 1), trajectory, header="time C")
+    # a truncated trajectory is left out of the averages
+    np.savetxt("traj_7", trajectories[0, :2], header="time C")
+
+    average_trajectories(4.0, 1.0, 7, quantiles=[0.5])
+    np.testing.assert_allclose(np.loadtxt("mean_traj"), trajectories.mean(axis=0), atol=1e-6)
+    np.testing.assert_allclose(np.loadtxt("var_traj"), trajectories.var(axis=0, ddof=1), atol=1e-6)
+    assert np.loadtxt("quantile_0.5_traj").shape == (4, 2)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from src.data.simulate_network import read_initial_counts, simulate, write_initial_counts
+from src.data.stochastic_simulation import from_reaction_lists
+
+
+def decay_network():
+    return from_reaction_lists([[[["A"], ["B"]]]], [{"A_B": 0.5}], n_initial={"A": 200}, record=["A", "B"])
+
+
+def test_initial_counts_round_trip(tmp_path):
+    write_initial_counts({"A": 200, "B": 3}, filename=str(tmp_path / "initial_counts"))
+    assert read_initial_counts(str(tmp_path / "initial_counts")) == {"A": 200, "B": 3}
+
+
+@pytest.mark.parametrize("ssa_method", ["direct", "ensemble"])
+def test_simulate_matches_binomial_decay(tmp_path, monkeypatch, ssa_method):
+    monkeypatch.chdir(tmp_path)
+    np.random.seed(0)
+    simulate(decay_network(), ["A", "B"], {"A": 200}, 2.0, 0.5, 400, ssa_method=ssa_method)
+
+    assert open("column_names").read().split() == ["time", "A", "B"]
+    mean = np.loadtxt("mean_traj")
+    variance = np.loadtxt("var_traj")
+    np.testing.assert_allclose(mean[:, 0], [0.5, 1.0, 1.5, 2.0])
+
+    survival = np.exp(-0.5 * mean[:, 0])
+    np.testing.assert_allclose(mean[:, 1], 200 * survival, atol=2.0)
+    np.testing.assert_allclose(mean[:, 1] + mean[:, 2], 200, atol=1e-6)
+    np.testing.assert_allclose(variance[:, 1], 200 * survival * (1 - survival), rtol=0.25)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.data.single_molecule import SingleMoleculeSimulator, total_output
+from src.data.stochastic_simulation import from_reaction_lists
+
+
+def kp_network():
+    '''R + Ls <-> RLs -> RLs_p with the phosphorylated complex catalysing Z -> Zp.'''
+    forward_rxns = [[["R", "Ls"], ["RLs"]], [["RLs"], ["RLs_p"]], [["RLs_p", "Z"], ["RLs_p", "Zp"]]]
+    reverse_rxns = [[["RLs"], ["R", "Ls"]], [["RLs_p"], ["R", "Ls"]]]
+    return from_reaction_lists([forward_rxns, reverse_rxns],
+                               [{"RLs_RLs": 0.05, "RLs_RLs_p": 0.5, "RLs_pZ_RLs_pZp": 0.01},
+                                {"RLs": 1.0, "RLs_p": 1.0}],
+                               n_initial={"R": 20, "Ls": 15, "Z": 30})
+
+
+def test_molecules_follow_the_counts():
+    network = kp_network()
+    simulator = SingleMoleculeSimulator(network, ligand_names=("Ls",))
+    carriers = [network.species_index(name) for name in ["Ls", "RLs", "RLs", "RLs_p"]]
+    assert list(simulator.carrier[simulator.carrier >= 0]) == carriers
+
+    np.random.seed(5)
+    times = np.linspace(0.5, 5.0, 10)
+    output, molecules = simulator.simulate(network.initial_counts({"R": 20, "Ls": 15, "Z": 30}), times,
+                                           record_molecules=True)
+    assert molecules.shape == (len(times), 15)
+    for counts, molecule_species in zip(output, molecules):
+        np.testing.assert_array_equal(np.bincount(molecule_species, minlength=network.num_species)[simulator.kind >= 0],
+                                      counts[simulator.kind >= 0])
+    assert output[-1, network.species_index("Zp")] > 0
+
+
+def test_reactions_moving_two_ligands_are_rejected():
+    network = from_reaction_lists([[[["Ls", "Lf"], ["LsLf"]]]], [{"LsLf_LsLf": 1.0}])
+    with pytest.raises(ValueError):
+        SingleMoleculeSimulator(network)
+
+
+def test_total_output_sums_ligand_columns():
+    times = np.array([1.0, 2.0])
+    mean = np.array([[1.0, 2.0, 3.0, 4.0], [5.0, 6.0, 7.0, 8.0]])
+    output = total_output(times, mean, ["R", "RLf", "RLs", "RLf_p"])
+    np.testing.assert_allclose(output, [[1.0, 1.0, 6.0, 3.0], [2.0, 5.0, 14.0, 7.0]])
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.data.spatial_simulation import NextSubvolumeMethod, SubvolumeLattice
+from src.data.stochastic_simulation import from_reaction_lists
+
+
+def region(edge=1.0):
+    return SimpleNamespace(x=2 * edge, y=2 * edge, depth=edge, subvolume_edge=edge, cytosol_depth=edge)
+
+
+def test_rates_are_per_subvolume():
+    network = from_reaction_lists([[[[], ["A"]], [["A"], ["B"]], [["A", "B"], ["C"]]]],
+                                  [{"_A": 1.0, "A_B": 2.0, "AB_C": 3.0}])
+    nsm = NextSubvolumeMethod(network, SubvolumeLattice(region(edge=2.0)))
+    np.testing.assert_allclose(nsm.network.rate_constants, [8.0, 2.0, 3.0 / 8.0])
+
+
+def test_diffusion_conserves_counts_within_regions():
+    network = from_reaction_lists([[[["P"], ["Z"]]]], [{"P_Z": 0.0}], n_initial={"P": 40, "Z": 40})
+    lattice = SubvolumeLattice(region())
+    nsm = NextSubvolumeMethod(network, lattice, diffusion_rates={"P": 1.0, "Z": 1.0},
+                              locations={"P": "Plasma", "Z": "Cytosol"})
+
+    np.random.seed(0)
+    output, subvolume_output = nsm.simulate([40, 40], [0.5, 5.0], record_subvolumes=True)
+
+    np.testing.assert_array_equal(output, [[40, 40], [40, 40]])
+    np.testing.assert_array_equal(subvolume_output[:, lattice.num_plasma:, 0], 0)
+    assert subvolume_output[-1, lattice.num_plasma:, 1].sum() > 0
+
+
+def test_decay_with_diffusion_matches_well_mixed_mean():
+    network = from_reaction_lists([[[["A"], ["B"]]]], [{"A_B": 0.5}], n_initial={"A": 100}, record=["A", "B"])
+    nsm = NextSubvolumeMethod(network, SubvolumeLattice(region()), diffusion_rates={"A": 1.0, "B": 1.0})
+
+    np.random.seed(0)
+    times = np.array([1.0, 2.0])
+    trajectories = np.array([nsm.simulate([100, 0], times) for j in range(100)])
+
+    np.testing.assert_allclose(trajectories.sum(axis=2), 100)
+    np.testing.assert_allclose(trajectories[:, :, 0].mean(axis=0), 100 * np.exp(-0.5 * times), atol=2.0)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.data.mass_action_network import MassActionNetwork
+from src.data.steady_state import SteadyStateSolver, conservation_laws
+
+
+def binding_network(r_0=100.0, kon=0.01, koff=0.5):
+    '''R + L <-> C with the initial L set by the parameter L_0.'''
+    reactants = np.array([[0, 1], [2, 3]])
+    stoichiometry = np.array([[-1, 1], [-1, 1], [1, -1]], dtype=float)
+    return MassActionNetwork(["R", "L", "C"], ["kon", "koff", "R_0", "L_0"], [kon, koff, r_0, 0.0], reactants,
+                             stoichiometry, np.ones(2), np.array([0, 1]), np.array([2, 3, -1]), ["O_C"],
+                             np.array([[0.0, 0.0, 1.0]]))
+
+
+def bound(r_0, l_0, kon=0.01, koff=0.5):
+    '''Root of kon (r_0 - c) (l_0 - c) = koff c below min(r_0, l_0).'''
+    b = r_0 + l_0 + koff / kon
+    return (b - np.sqrt(b ** 2 - 4 * r_0 * l_0)) / 2
+
+
+def test_conservation_laws():
+    network = binding_network()
+    np.testing.assert_allclose(conservation_laws(network.stoichiometry).dot(network.stoichiometry), 0, atol=1e-12)
+    assert conservation_laws(network.stoichiometry).shape == (2, 3)
+
+
+def test_newton_reaches_binding_equilibrium():
+    network = binding_network()
+    solver = SteadyStateSolver(network)
+    y0 = np.array([100.0, 40.0, 0.0])
+
+    y, converged = solver.newton(y0, y0)
+    c = bound(100.0, 40.0)
+    assert converged
+    np.testing.assert_allclose(y, [100.0 - c, 40.0 - c, c], rtol=1e-8)
+
+
+def test_newton_needs_a_small_residual():
+    y0 = np.array([100.0, 40.0, 0.0])
+    solver = SteadyStateSolver(binding_network(), atol=1e3, max_iterations=1)
+    assert not solver.newton(y0, y0)[1]
+
+
+def test_sweep_matches_equilibrium_in_input_order():
+    network = binding_network()
+    solver = SteadyStateSolver(network)
+    ligand = np.array([500.0, 3.0, 80.0, 20.0])
+
+    steady_states = solver.solve_sweep('L_0', ligand, 1000.0)
+    np.testing.assert_allclose(steady_states[:, 2], bound(100.0, ligand), rtol=1e-8)
+    assert solver.num_newton == len(ligand)
+    assert solver.num_integrated == 0
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+
+from src.data.stochastic_simulation import IndexedPriorityQueue, from_mass_action, from_reaction_lists, methods
+from src.models.finite_state_projection import FiniteStateProjection
+from tests.test_mass_action_network import dimer_network
+
+
+def binding_network():
+    '''A + B <-> C and A + A -> D from the forward/reverse lists of the SSC ligand classes.'''
+    forward_rxns = [[["A", "B"], ["C"]], [["A", "A"], ["D"]]]
+    reverse_rxns = [[["C"], ["A", "B"]]]
+    return from_reaction_lists([forward_rxns, reverse_rxns], [{"AB_C": 0.4, "AA_D": 0.1}, {"C": 1.0}],
+                               n_initial={"A": 6, "B": 4}, record=["C", "D"])
+
+
+def test_propensities_count_distinct_pairs():
+    network = binding_network()
+    assert network.species == ["A", "B", "C", "D"]
+    np.testing.assert_allclose(network.propensities(network.extend([6, 4, 2, 0])), [0.4 * 24, 0.1 * 15, 2.0])
+
+
+def test_mass_action_homodimer_rate():
+    network = from_mass_action(dimer_network())
+    # 1/2 kd A^2 deterministic rate becomes kd A (A - 1) / 2
+    np.testing.assert_allclose(network.propensities(network.extend([10, 5, 0, 0]))[2], 0.001 * 0.5 * 10 * 9)
+
+
+def test_priority_queue_tracks_the_minimum():
+    queue = IndexedPriorityQueue(np.array([3.0, 1.0, 2.0, np.inf]))
+    assert queue.top() == (1, 1.0)
+    queue.update(1, 5.0)
+    assert queue.top() == (2, 2.0)
+    queue.update(3, 0.5)
+    assert queue.top() == (3, 0.5)
+
+
+@pytest.mark.parametrize("method", sorted(methods))
+def test_engines_match_finite_state_projection(method):
+    network = binding_network()
+    initial_counts = network.initial_counts({"A": 6, "B": 4})
+    times = np.array([0.5, 2.0])
+    record = [network.species_index("C"), network.species_index("D")]
+
+    fsp = FiniteStateProjection(network, tolerance=1e-10)
+    p = fsp.solve([initial_counts], times[-1])[0]
+    exact_mean = p.dot(fsp.states[:, record])
+    exact_variance = p.dot(fsp.states[:, record] ** 2) - exact_mean ** 2
+
+    np.random.seed(1)
+    num_trajectories = 2000
+    if method == "ensemble":
+        mean, variance = methods[method](network).simulate(initial_counts, times, num_trajectories, record=record)
+    else:
+        simulator = methods[method](network)
+        trajectories = np.array([simulator.simulate(initial_counts, times, record=record)
+                                 for j in range(num_trajectories)])
+        mean, variance = trajectories.mean(axis=0), trajectories.var(axis=0, ddof=1)
+
+    assert np.all(np.abs(mean[-1] - exact_mean) < 4 * np.sqrt(exact_variance / num_trajectories))
+    np.testing.assert_allclose(variance[-1], exact_variance, rtol=0.15)
+
+
+def test_tau_leaping_takes_leaps_at_high_copy_numbers():
+    kf, kr, a_0, b_0 = 1e-5, 1.0, 100000, 50000
+    network = from_reaction_lists([[[["A", "B"], ["C"]]], [[["C"], ["A", "B"]]]], [{"AB_C": kf}, {"C": kr}])
+    times = np.array([0.2, 5.0])
+
+    def rhs(t, c):
+        return kf * (a_0 - c) * (b_0 - c) - kr * c
+    exact = solve_ivp(rhs, (0.0, times[-1]), [0.0], t_eval=times, rtol=1e-10, atol=1e-6).y[0]
+    b = a_0 + b_0 + kr / kf
+    np.testing.assert_allclose(exact[-1], (b - np.sqrt(b ** 2 - 4 * a_0 * b_0)) / 2, rtol=1e-4)
+
+    np.random.seed(14)
+    simulator = methods["tau_leap"](network)
+    record = [network.species_index("C")]
+    trajectories = np.array([simulator.simulate(network.initial_counts({"A": a_0, "B": b_0}), times, record=record)
+                             for j in range(20)])[:, :, 0]
+    np.testing.assert_allclose(trajectories.mean(axis=0), exact, rtol=0.01)
+    assert simulator.num_firings > 100 * simulator.num_steps